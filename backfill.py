@@ -0,0 +1,248 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Concurrent backfill of daily game statistics.  The box score lists for all
+requested days are read in parallel, then every game of every day is read in
+parallel by a bounded worker pool.  A game that fails is reported and the
+rest of its day is still processed and saved; the day is marked partial in
+the manifest so that it is picked up again on the next run.
+
+In streaming mode days are read one after another, and each game is written
+to the day's part file (p<yyyymmdd>.ndjson) as soon as it is parsed, so only
+the games in flight are held in memory.  The day file is then built from the
+part file.  A part file left by an interrupted run is picked up: its games
+are not read again.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+
+from sources import statdir, box_read, box_url
+from season_store import store_day
+from metrics import day_count, record, timed_call
+from day_manifest import mark_day, write_text_atomic
+from pipeline import run_games
+from schedule import note_day, scheduled_games
+
+SOURCE_WORKERS = {'cbs': 8, 'br': 2}
+
+def day_file(website, yyyymmdd):
+    """
+    Name of the saved stats file for a day
+    """
+    return os.sep.join([statdir(website), f'a{yyyymmdd}.json'])
+
+def fmt_day(website, game_stats):
+    """
+    Day file layout: baseball-reference saves a list of games, cbs saves a
+    dict keyed by game id
+    """
+    if website == 'br':
+        return game_stats
+    return dict(game_stats)
+
+def write_day(website, yyyymmdd, game_stats):
+    """
+    Save a day's game statistics to its json file (atomically) and to the
+    season store, and update the running season totals.  Returns the sha256
+    of the day file.
+    """
+    from season_agg import apply_day  # pylint: disable=import-outside-toplevel
+    sha256 = timed_call('write', write_text_atomic, day_file(website, yyyymmdd),
+                        json.dumps(fmt_day(website, game_stats)))
+    timed_call('aggregate', apply_day, website, yyyymmdd, timed_call(
+            'store', store_day, website, yyyymmdd,
+            fmt_day(website, game_stats)))
+    return sha256
+
+def read_urls(website, yyyymmdd):
+    """
+    Box score urls for a day, as [urls, error].  The game count is noted in
+    the schedule index.
+    """
+    def ru_inner(urls):
+        note_day(website, yyyymmdd, len(urls))
+        return [urls, None]
+    with record('scoreboard', website, yyyymmdd) as rec:
+        try:
+            return ru_inner(box_url(website)(yyyymmdd))
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            rec |= {'ok': False, 'error': repr(exc)}
+            return [[], repr(exc)]
+
+def read_game(website, yyyymmdd, url):
+    """
+    Statistics for one game, as [url, stats, error]
+    """
+    with record('game', website, yyyymmdd, url=url) as rec:
+        try:
+            return [url, box_read(website)(url), None]
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            rec |= {'ok': False, 'error': repr(exc)}
+            return [url, None, repr(exc)]
+
+def day_outcome(url_info, games, failed, expected=None):
+    """
+    Manifest status for a day.  A day with fewer games saved than expected
+    (the schedule's count) is partial.
+    """
+    if url_info[1] is not None or (games and len(failed) == len(games)):
+        return 'failed'
+    if not games and not expected:
+        return 'no_games'
+    if failed or len(games) - len(failed) < (expected or 0):
+        return 'partial'
+    return 'complete'
+
+def finish_day(website, yyyymmdd, url_info, games):
+    """
+    Save the games of a day that were read, record the day in the manifest,
+    and return a report for the day
+    """
+    def fd_inner(failed, status, rec):
+        def fd_sha():
+            if status == 'failed':
+                return None
+            return write_day(website, yyyymmdd, list(map(
+                    lambda a: a[1], filter(lambda a: a[2] is None, games))))
+        all_failed = failed + list(filter(lambda a: a[1], [
+                ['scoreboard', url_info[1]]]))
+        mark_day(website, yyyymmdd, status, len(games) - len(failed),
+                 fd_sha(), all_failed, list(map(
+                     lambda a: a[0], filter(lambda a: a[2] is None, games))))
+        rec |= {'status': status, 'written': status != 'failed'}
+        return {'day': yyyymmdd, 'games': len(games), 'status': status,
+                'written': status != 'failed', 'failed': all_failed,
+                'runners_dropped': day_count(website, yyyymmdd,
+                                             'runners_dropped')}
+    with record('day', website, yyyymmdd) as rec:
+        def fd_failed(failed):
+            return fd_inner(failed, day_outcome(url_info, games, failed,
+                                                scheduled_games(yyyymmdd)),
+                            rec)
+        return fd_failed(list(map(lambda a: [a[0], a[2]],
+                                  filter(lambda a: a[2] is not None, games))))
+
+def report_day(report):
+    """
+    Print the failures for a day, and the number of baserunners that could
+    not be attributed to a batting line
+    """
+    def rd_inner(failure):
+        print(f'Failed {report["day"]} {failure[0]}: {failure[1]}')
+    list(map(rd_inner, report['failed']))
+    if report.get('runners_dropped'):
+        print(f'Dropped {report["day"]}: {report["runners_dropped"]} ' +
+              'unattributed baserunners')
+    return report
+
+def backfill_days(website, days, workers=None, parse_workers=0, stream=False):
+    """
+    Collect and save the stats for each day in days (yyyymmdd strings) using
+    up to workers concurrent requests (default set per website in
+    SOURCE_WORKERS).  If parse_workers is set, pages are parsed by that many
+    processes instead of by the request threads.  If stream is set, games are
+    streamed to part files (parse_workers is then not used).  Returns a
+    report for each day.
+    """
+    if stream:
+        return backfill_stream(website, days, workers)
+    if parse_workers:
+        return backfill_pool(website, days, workers, parse_workers)
+    with ThreadPoolExecutor(
+            max_workers=workers or SOURCE_WORKERS[website]) as pool:
+        def bd_games(day_urls):
+            return list(map(lambda a: pool.submit(read_game, website,
+                                                  day_urls[0], a),
+                            day_urls[1][0]))
+        def bd_inner(all_urls):
+            def bd_day(day_info):
+                return report_day(finish_day(website, day_info[0],
+                        day_info[1], list(map(lambda a: a.result(),
+                        day_info[2]))))
+            return list(map(bd_day, list(zip(days, all_urls,
+                            list(map(bd_games, zip(days, all_urls)))))))
+        return bd_inner(list(pool.map(lambda a: read_urls(website, a),
+                                      days)))
+
+def backfill_pool(website, days, workers, parse_workers):
+    """
+    backfill_days with page reads and parsing split between request threads
+    and a process pool
+    """
+    with ThreadPoolExecutor(
+            max_workers=workers or SOURCE_WORKERS[website]) as pool:
+        all_urls = list(pool.map(lambda a: read_urls(website, a), days))
+    url_info = dict(zip(days, all_urls))
+    def bp_day(day, games):
+        return report_day(finish_day(website, day, url_info[day], games))
+    return run_games(website, list(map(lambda a: [a, url_info[a][0]], days)),
+                     bp_day, workers or SOURCE_WORKERS[website],
+                     parse_workers)
+
+def part_file(website, yyyymmdd):
+    """
+    Name of the file a day's games are streamed to
+    """
+    return os.sep.join([statdir(website), f'p{yyyymmdd}.ndjson'])
+
+def read_part(website, yyyymmdd):
+    """
+    {url: stats} for the games in a day's part file (a line cut short by an
+    interrupted run is skipped)
+    """
+    def rp_line(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    try:
+        with open(part_file(website, yyyymmdd), 'r', encoding='utf-8') as ifd:
+            return dict(map(lambda a: [a['url'], a['stats']],
+                            filter(None, map(rp_line, ifd))))
+    except FileNotFoundError:
+        return {}
+
+def stream_day(website, yyyymmdd, url_info, pool):
+    """
+    Read the games of a day not yet in its part file, appending each one to
+    the part file as it finishes, then save the day from the part file.  The
+    part file is removed once the day is written, and kept (for the next run
+    to resume from) otherwise.  Returns the day's report.
+    """
+    def sd_write(ofd, result):
+        if result[2] is not None:
+            return [result[0], None, result[2]]
+        ofd.write(json.dumps({'url': result[0], 'stats': result[1]}) + '\n')
+        ofd.flush()
+        return None
+    def sd_finish(failed):
+        def sf_inner(parts):
+            return list(map(lambda a: failed.get(a, [a, parts.get(a), None]),
+                            filter(lambda a: a in parts or a in failed,
+                                   url_info[0])))
+        return finish_day(website, yyyymmdd, url_info,
+                          sf_inner(read_part(website, yyyymmdd)))
+    done = set(read_part(website, yyyymmdd))
+    os.makedirs(statdir(website), exist_ok=True)
+    with open(part_file(website, yyyymmdd), 'a', encoding='utf-8') as ofd:
+        if ofd.tell():
+            ofd.write('\n')
+        # as_completed holds the only reference to each future and drops it
+        # once yielded, so a game's stats are released when they are written
+        failed = dict(map(lambda a: [a[0], a], filter(None, map(
+                lambda a: sd_write(ofd, a.result()), as_completed(list(map(
+                        lambda a: pool.submit(read_game, website, yyyymmdd, a),
+                        filter(lambda a: a not in done, url_info[0]))))))))
+    report = sd_finish(failed)
+    if report['written']:
+        os.remove(part_file(website, yyyymmdd))
+    return report
+
+def backfill_stream(website, days, workers):
+    """
+    backfill_days in streaming mode
+    """
+    with ThreadPoolExecutor(
+            max_workers=workers or SOURCE_WORKERS[website]) as pool:
+        return list(map(lambda a: report_day(stream_day(
+                website, a, read_urls(website, a), pool)), days))
@@ -2,10 +2,9 @@
 """
 Baseball reference parser
 """
-import secrets
-import time
-import requests
-from bs4 import Comment, BeautifulSoup as bs
+from fetch_page import fetch_page
+from html_parse import make_soup, comment_tables, page_title
+from metrics import timed, timed_call
 
 def reind(indv):
     """
@@ -90,20 +89,34 @@ def br_get_game_stats(page):
             def mk_dict(pinfo):
                 return dict(pinfo[0]) | dict(pinfo[1])
             return mk_dict(list(map(get_pls, [1, 2])))
-        return [get_plists(get_teams(soup[1])), handle_pitching(soup[0])]
+        def xt_inner(teams):
+            return [get_plists(teams), handle_pitching(soup[0]),
+                    pitcher_info(soup[0], teams)]
+        return xt_inner(get_teams(soup[1]))
     def merge_bp(all_data):
         def mbp_inner(bat_data):
             def bp_merge(pit_data):
                 def mrg_w_pit(player):
+                    def mwp_line():
+                        if player in bat_data:
+                            return bat_data[player]
+                        return all_data[2][player]
                     if player not in pit_data.keys():
-                        return [player, bat_data[player]]
-                    return [player, bat_data[player] |
+                        return [player, mwp_line()]
+                    return [player, mwp_line() |
                             {'pitching': pit_data[player]}]
-                return dict(list(map(mrg_w_pit, bat_data)))
+                return dict(list(map(mrg_w_pit, list(bat_data) + list(
+                        filter(lambda a: a not in bat_data, pit_data)))))
             return bp_merge(all_data[1])
         return mbp_inner(add_cols(all_data[0]))
-    return merge_bp(xtract_tms(br_parse_com(page)))
+    def bggs_done(parsed):
+        try:
+            return merge_bp(xtract_tms(parsed))
+        finally:
+            list(map(lambda a: a.decompose(), parsed[0]))
+    return bggs_done(br_parse_com(page))
 
+@timed('handle_pitching')
 def handle_pitching(raw_soup):
     """
     Parse the pitching table information
@@ -148,20 +161,36 @@ def handle_pitching(raw_soup):
     return hp_inner(list(map(lambda a: a.find_all('tr'),
                              raw_soup[3].find_all('tbody'))))
 
+def pitcher_info(raw_soup, teams):
+    """
+    Name, team and position of each pitcher in the pitching table (the
+    visitors' pitchers come first), so that pitchers without a batting line
+    are kept
+    """
+    def pi_team(tm_info):
+        def pi_plyr(pl_info):
+            return [reind(pl_info.find('a')['href']),
+                    {'name': pl_info.find('a').text, 'team': tm_info[1],
+                     'position': 'P'}]
+        return dict(map(pi_plyr, tm_info[0].find_all('tr')))
+    return dict(sum(map(lambda a: list(pi_team(a).items()), zip(
+            raw_soup[3].find_all('tbody'),
+            [teams['visitor'], teams['home']])), []))
+
 def br_parse_com(page):
     """
     Return Beautiful Soup data for a box score and a dict naming the visiting
-    and home teams.
-    """
-    def bggs_inner(soup):
-        def bggs_uncom(com):
-            def bggs_tcom(tcom):
-                return list(map(lambda a: bs(a, 'html.parser'), tcom))
-            return bggs_tcom(list(filter(lambda a: '<table' in a, com)))
-        return [bggs_uncom(soup(text=lambda text: isinstance(text, Comment))),
-                soup.find('title').text]
-    time.sleep(secrets.randbits(4))
-    return bggs_inner(bs(requests.get(page, timeout=15).text, 'html.parser'))
+    and home teams.  Only the first four commented-out tables (the two
+    batting tables at 1 and 2 and the pitching table at 3) are parsed; the
+    rest of the page is never turned into a tree.
+    """
+    def bggs_inner(text):
+        def bggs_tcom(tcom):
+            return list(map(lambda a: make_soup(a, 'table'), tcom))
+        return [timed_call('comments', bggs_tcom, timed_call(
+                           'soup', comment_tables, text, 4)),
+                page_title(text)]
+    return bggs_inner(fetch_page(page))
 
 def br_parse_day(url):
     """
@@ -172,12 +201,11 @@ def br_parse_day(url):
             if tag['href'].startswith('/boxes/'):
                 return True
         return False
-    def make_soup():
-        time.sleep(secrets.randbits(4))
-        return bs(requests.get(url, timeout=15).text,
-                  'html.parser').find_all('a', href=True)
+    def link_soup():
+        return timed_call('soup', make_soup, fetch_page(url), 'a',
+                          href=True).find_all('a', href=True)
     return list(map(lambda a: 'https://www.baseball-reference.com' +
-                    a['href'], list(filter(findg, make_soup()))))
+                    a['href'], list(filter(findg, link_soup()))))
 
 
 def br_get_box_urls(yyyymmdd):
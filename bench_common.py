@@ -0,0 +1,55 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Baseline handling shared by the benchmark suites (bench_parsers,
+bench_startup): storing and loading a suite's baseline json, ratios of
+results to it, and the final report and exit status.
+"""
+import json
+
+def load_baseline(fname):
+    """
+    Stored baseline results ({} if there is none)
+    """
+    try:
+        with open(fname, 'r', encoding='utf-8') as ifd:
+            return json.load(ifd)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(fname, results):
+    """
+    Store results as the new baseline
+    """
+    with open(fname, 'w', encoding='utf-8') as ofd:
+        ofd.write(json.dumps(results, indent=2, sort_keys=True))
+    return results
+
+def ratio(results, baseline, name, key):
+    """
+    results[name][key] over the baseline's value (None if it has none)
+    """
+    if not baseline.get(name, {}).get(key):
+        return None
+    return results[name][key] / baseline[name][key]
+
+def fmt_ratio(value):
+    """
+    Printable ratio ('-' when there is no baseline value)
+    """
+    if value is None:
+        return '     -'
+    return f'{value:6.2f}'
+
+def finish(results, fname, save, compare):
+    """
+    Store results as the baseline if save is set, print compare(results,
+    baseline) ([report, regressions]) and return the exit status
+    """
+    if save:
+        save_baseline(fname, results)
+    report, regressions = compare(results, load_baseline(fname))
+    print(report)
+    if regressions:
+        print(f'regressions: {", ".join(regressions)}')
+        return 1
+    return 0
@@ -0,0 +1,169 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Synthetic page corpus for the parser benchmarks.
+
+Real scoreboard and box score pages cannot be checked in, so the corpus in
+bench_corpus/ is made of generated pages with the same structure the parsers
+read: CBS scoreboards and box scores (batting and pitching tables, and SB
+and CS runner lines with one section per team in away/home order, the block
+appearing twice as on the website) and Baseball-Reference scoreboards and
+box scores (batting and pitching tables inside html comments, pitchers
+without a batting line).
+The stats are drawn from a seeded generator, so the corpus is the same on
+every run.
+
+usage:
+    python bench_fixtures.py [--corpus DIR] [--days N] [--games N]
+"""
+import argparse
+import random
+import sys
+
+from fetch_page import archive_write
+from bench_parsers import CBS_DAY, CORPUS, use_archive
+
+FIRST_DAY = 20230718
+MATCHUPS = [['SF', 'CIN'], ['NYY', 'BOS'], ['LAD', 'SD'], ['HOU', 'TEX'],
+            ['ATL', 'NYM'], ['CHC', 'STL'], ['SEA', 'OAK'], ['MIN', 'CLE']]
+POSITIONS = ['C', '1B', '2B', '3B', 'SS', 'LF', 'CF', 'RF', 'DH']
+
+def innings(rnd):
+    """
+    Random innings pitched value ('5.2')
+    """
+    return f'{rnd.randint(0, 6)}.{rnd.randint(0, 2)}'
+
+def cbs_box(teams, seed):
+    """
+    CBS box score page for a game
+    """
+    rnd = random.Random(seed)
+    def cb_bat(base):
+        return ('<table><tr><td>lineup</td></tr></table><table><tr>' +
+                '<th>HITTERS</th><th>AB</th><th>R</th><th>H</th><th>RBI</th>' +
+                '<th>HR</th><th>BB</th><th>AVG</th></tr>' + ''.join(map(
+                lambda a: f'<tr><td><a href="/mlb/players/{base + a}/' +
+                f'player-{base + a}/">P. Pl{base + a}</a> {POSITIONS[a]}</td>' +
+                ''.join(map(lambda b: f'<td>{rnd.randint(0, b)}</td>',
+                            [5, 2, 3, 3, 1, 2])) + '<td>.250</td></tr>',
+                range(9))) + '</table>')
+    def cb_pit(base, decision):
+        return ('<table><tr><td>staff</td></tr></table><table><tr>' +
+                '<th>PITCHERS</th><th>IP</th><th>H</th><th>R</th><th>ER</th>' +
+                '<th>BB</th><th>SO</th></tr>' + ''.join(map(
+                lambda a: f'<tr><td><a href="/mlb/players/{base + a}/' +
+                f'pitcher-{base + a}/">Q. Pi{base + a}</a> ' +
+                f'{[decision, ""][int(a > 0)]}</td><td>{innings(rnd)}</td>' +
+                ''.join(map(lambda b: f'<td>{rnd.randint(0, b)}</td>',
+                            [6, 4, 4, 3, 9])) + '</tr>', range(3))) +
+                '</table>')
+    base = seed * 100
+    return ('<html><head><title>Box Score</title></head><body>' +
+            cb_bat(base) + cb_bat(base + 50) + cb_pit(base + 20, '(W, 3-2)') +
+            cb_pit(base + 70, '(L, 1-1)') +
+            2 * (f'<div><b>SB</b> - P. Pl{base + 2} 2 (5), ' +
+                 f'P. Pl{base + 7} (1)</div>' +
+                 f'<div><b>SB</b> - P. Pl{base + 54} (1)</div>' +
+                 f'<div><b>CS</b> - P. Pl{base + 6} (2)</div>') +
+            f'<script>var game = "{teams[0]}@{teams[1]}";</script>' +
+            '</body></html>')
+
+def cbs_scoreboard(day, games):
+    """
+    CBS scoreboard page for a day
+    """
+    return '<html><body>' + ''.join(map(
+            lambda a: '<div class="card"><span>Final</span><a href="' +
+            f'/mlb/gametracker/boxscore/MLB_{day}_{a[0]}@{a[1]}/">Box</a>' +
+            '</div>', games)) + '</body></html>'
+
+def br_box(teams, day, seed):
+    """
+    Baseball-Reference box score page for a game
+    """
+    rnd = random.Random(seed)
+    def bb_bat(base):
+        return '<table><tbody>' + ''.join(map(
+                lambda a: '<tr><th data-stat="player"><a href="/players/x/' +
+                f'plyr{base + a}.shtml">Player {base + a}</a> ' +
+                f'{POSITIONS[a]}</th>' + ''.join(map(
+                        lambda b: f'<td data-stat="{b[0]}">' +
+                        f'{rnd.randint(0, b[1])}</td>',
+                        [['AB', 5], ['R', 2], ['H', 3], ['RBI', 3],
+                         ['BB', 2]])) +
+                '<td data-stat="details">' +
+                f'{rnd.choice(["", "HR", "2·SB", "HR,SB", "2B"])}</td></tr>' +
+                ['', '<tr class="spacer"><td></td></tr>'][int(a == 4)],
+                range(9))) + '</tbody></table>'
+    def bb_pit(base, decision):
+        return '<tbody>' + ''.join(map(
+                lambda a: '<tr><th data-stat="player"><a href="/players/x/' +
+                f'pit{base + a}.shtml">Pitcher {base + a}</a>' +
+                f'{[decision, ""][int(a > 0)]}</th><td data-stat="IP">' +
+                f'{innings(rnd)}</td>' + ''.join(map(
+                        lambda b: f'<td data-stat="{b[0]}">' +
+                        f'{rnd.randint(0, b[1])}</td>',
+                        [['H', 6], ['R', 4], ['ER', 4], ['BB', 3],
+                         ['SO', 9]])) + '</tr>', range(3))) + '</tbody>'
+    base = seed * 100
+    return (f'<html><head><title>{teams[0]} vs {teams[1]} Box Score: ' +
+            f'{day} | Baseball-Reference.com</title></head><body>' +
+            '<!-- <table><tr><td>line score</td></tr></table> -->' +
+            f'<!-- {bb_bat(base)} --><!-- {bb_bat(base + 50)} -->' +
+            f'<!-- <table>{bb_pit(base + 20, ", W (3-2)")}' +
+            f'{bb_pit(base + 70, ", L (1-1)")}</table> -->' +
+            '<!-- other comment --></body></html>')
+
+def br_scoreboard(links):
+    """
+    Baseball-Reference scoreboard page for a day
+    """
+    return '<html><body>' + ''.join(map(
+            lambda a: f'<a href="/boxes/{a}.shtml">Final</a>', links)) + \
+           '<a href="/leagues/">Leagues</a></body></html>'
+
+def day_pages(day, games, seed):
+    """
+    [url, text] for the scoreboards and box scores of a day
+    """
+    def dp_inner(matchups):
+        br_links = list(map(lambda a: f'{a[1]}/{a[1]}{day}0', matchups))
+        return [[CBS_DAY + f'{day}/', cbs_scoreboard(day, matchups)]] + \
+               list(map(lambda a: [
+                       'https://cbssports.com/mlb/gametracker/boxscore/' +
+                       f'MLB_{day}_{a[1][0]}@{a[1][1]}/',
+                       cbs_box(a[1], seed + a[0])], enumerate(matchups))) + \
+               [['https://www.baseball-reference.com/boxes/?' +
+                 f'year={day[0:4]}&month={day[4:6]}&day={day[6:8]}',
+                 br_scoreboard(br_links)]] + \
+               list(map(lambda a: [
+                       f'https://www.baseball-reference.com/boxes/{a[1]}.shtml',
+                       br_box(list(map(lambda b: f'Team {b}', matchups[a[0]])),
+                              day, seed + a[0])], enumerate(br_links)))
+    return dp_inner(MATCHUPS[0:games])
+
+def build_corpus(corpus=CORPUS, days=2, games=4):
+    """
+    Write the synthetic pages of days days of games games each into the
+    corpus.  Returns the number of pages written.
+    """
+    pages = sum(map(lambda a: day_pages(str(FIRST_DAY + a), games,
+                                        10 * a + 1), range(days)), [])
+    with use_archive(corpus):
+        list(map(lambda a: archive_write(*a), pages))
+    return len(pages)
+
+def main(argv):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='build the bench corpus')
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--days', type=int, default=2)
+    parser.add_argument('--games', type=int, default=4)
+    args = parser.parse_args(argv)
+    print(f'{build_corpus(args.corpus, args.days, args.games)} pages written')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,289 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Benchmark suite for the CBS and Baseball-Reference parsers.
+
+The corpus (bench_corpus/) is a page archive in the fetch_page format holding
+saved scoreboard and box score pages, so every stage runs by offline replay
+with the pages preloaded in memory.  The checked-in corpus is synthetic
+(written by bench_fixtures.py); --record copies real pages into a corpus.
+For each stage the per-item latency, items per second and peak traced
+memory are reported and compared with the stored baseline
+(bench_baseline.json); a stage whose memory or median latency is above the
+baseline by more than its tolerance is a regression.  Latency has a looser
+tolerance and is only gated for stages whose baseline median is at least
+MIN_MS, as shorter ones vary too much from run to run.  The checked-in
+baseline was taken on one machine; its memory peaks carry over to others,
+its latencies only roughly.
+
+Each box score is also checked to give the same relevant_digest (used by
+refresh to ignore page changes the parsers do not read) when script and
+advertising content is added to it, and a different one when a stolen base
+line changes.
+
+usage:
+    python bench_parsers.py                 run and compare with baseline
+    python bench_parsers.py --save          run and store a new baseline
+    python bench_parsers.py --record ARCHIVE DAY [DAY ...]
+                                            copy days from a page archive
+                                            into the corpus
+    python bench_parsers.py --profile WEBSITE URL
+                                            profile one game of the corpus
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+
+import fetch_page
+from fetch_page import archive_read, archive_write, archived_urls, \
+        relevant_digest
+from html_parse import PARSERS, set_parser
+from metrics import profile_game
+from bench_common import finish, fmt_ratio, ratio
+from sources import box_read
+from cbs_get_game_stats import cbs_get_game_stats, cbs_get_box_urls, \
+        get_raw_stats
+from cbs_get_sb_info import stats_with_sb
+from baseb_ref import br_get_game_stats, br_get_box_urls, br_parse_com, \
+        handle_pitching
+
+CORPUS = 'bench_corpus'
+BASELINE = 'bench_baseline.json'
+TOLERANCE = 0.25
+TIME_TOLERANCE = 0.5
+MIN_MS = 2.0
+CBS_DAY = 'https://www.cbssports.com/mlb/scoreboard/'
+BR_DAY = 'https://www.baseball-reference.com/boxes/?'
+
+def corpus_days(archive=CORPUS):
+    """
+    Days (yyyymmdd) with a cbs or baseball-reference scoreboard in the corpus
+    """
+    with use_archive(archive):
+        return sorted(set(map(lambda a: a[len(CBS_DAY):].strip('/'),
+                              archived_urls(CBS_DAY))) |
+                      set(map(lambda a: ''.join(map(
+                              lambda b: b.split('=')[1],
+                              a[len(BR_DAY):].split('&'))),
+                              archived_urls(BR_DAY))))
+
+@contextlib.contextmanager
+def use_archive(archive):
+    """
+    Replay pages from archive for the duration of a with block
+    """
+    saved = dict(fetch_page.FETCH_CONFIG)
+    fetch_page.set_fetch_mode('offline', archive)
+    try:
+        yield archive
+    finally:
+        fetch_page.FETCH_CONFIG.update(saved)
+
+def quiet(func):
+    """
+    func with its progress printing suppressed
+    """
+    def q_inner(arg):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(arg)
+    return q_inner
+
+def day_urls(func, days):
+    """
+    Box score urls for days, skipping days whose scoreboard is not saved
+    """
+    def du_day(day):
+        try:
+            return func(day)
+        except LookupError:
+            return []
+    return sum(map(du_day, days), [])
+
+def stage_plan(days):
+    """
+    [stage name, function, inputs] for each benchmarked stage.  Inputs for
+    the inner stages (stats_with_sb, handle_pitching) are parsed up front so
+    only the stage itself is timed.
+    """
+    cbs_urls = day_urls(cbs_get_box_urls, days)
+    br_urls = day_urls(br_get_box_urls, days)
+    return [
+        ['cbs_get_box_urls', cbs_get_box_urls, days],
+        ['br_get_box_urls', br_get_box_urls, days],
+        ['cbs_get_game_stats', quiet(cbs_get_game_stats), cbs_urls],
+        ['stats_with_sb', stats_with_sb, list(map(get_raw_stats, cbs_urls))],
+        ['br_get_game_stats', br_get_game_stats, br_urls],
+        ['handle_pitching', handle_pitching,
+         list(map(lambda a: br_parse_com(a)[0], br_urls))],
+        ['end_to_end_day', quiet(lambda a: [
+            list(map(cbs_get_game_stats, day_urls(cbs_get_box_urls, [a]))),
+            list(map(br_get_game_stats, day_urls(br_get_box_urls, [a])))]),
+         days],
+    ]
+
+def time_items(func, inputs):
+    """
+    Seconds taken for each input
+    """
+    def ti_one(arg):
+        start = time.perf_counter()
+        func(arg)
+        return time.perf_counter() - start
+    return list(map(ti_one, inputs))
+
+def peak_memory(func, inputs):
+    """
+    Largest traced allocation peak (bytes) for any single input
+    """
+    def pm_one(arg):
+        tracemalloc.start()
+        func(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    return max(map(pm_one, inputs), default=0)
+
+def run_stage(stage, repeat):
+    """
+    Timing and memory results for one stage
+    """
+    def rs_inner(times):
+        if not times:
+            return {'items': 0}
+        return {'items': len(stage[2]),
+                'mean_ms': 1e3 * statistics.mean(times),
+                'median_ms': 1e3 * statistics.median(times),
+                'p95_ms': 1e3 * sorted(times)[int(0.95 * (len(times) - 1))],
+                'per_second': len(times) / sum(times),
+                'peak_kb': peak_memory(stage[1], stage[2]) / 1024}
+    return rs_inner(sum(map(lambda a: time_items(stage[1], stage[2]),
+                            range(repeat)), []))
+
+def run_suite(repeat=5, archive=CORPUS):
+    """
+    Results for every stage over the corpus
+    """
+    with use_archive(archive):
+        fetch_page.preload_pages(archived_urls())
+        try:
+            return {stage[0]: run_stage(stage, repeat)
+                    for stage in stage_plan(corpus_days(archive))}
+        finally:
+            fetch_page.PAGE_MEMO.clear()
+
+def compare(results, baseline, tolerance=TOLERANCE,
+            time_tolerance=TIME_TOLERANCE):
+    """
+    Lines comparing results with the baseline, and the list of regressions
+    """
+    def cmp_stage(name):
+        return [name, ratio(results, baseline, name, 'median_ms'),
+                ratio(results, baseline, name, 'peak_kb')]
+    def fmt_line(cmp):
+        if not results[cmp[0]]['items']:
+            return f'{cmp[0]:20} no items in corpus'
+        stats = results[cmp[0]]
+        return (f'{cmp[0]:20} {stats["items"]:5} items '
+                f'{stats["median_ms"]:9.2f} ms/item '
+                f'{stats["per_second"]:9.1f} /s '
+                f'{stats["peak_kb"]:9.0f} KB peak '
+                f'x{fmt_ratio(cmp[1])} time x{fmt_ratio(cmp[2])} mem')
+    def regressed(cmp):
+        def rg_over(value, limit):
+            return value is not None and value > 1 + limit
+        return (rg_over(cmp[1], time_tolerance) and
+                baseline[cmp[0]]['median_ms'] >= MIN_MS) or \
+               rg_over(cmp[2], tolerance)
+    cmps = list(map(cmp_stage, results))
+    return ['\n'.join(map(fmt_line, cmps)),
+            list(map(lambda a: a[0], filter(regressed, cmps)))]
+
+NOISE = ['<script>var served = "{n}";</script>',
+         '<div class="ad"><span>Sponsored</span> - offer {n}</div>']
+
+def digest_checks(archive=CORPUS):
+    """
+    Box scores of the corpus whose relevant digest changes when script or
+    advertising content changes, or (for pages with stolen base lines) does
+    not change when a stolen base line does
+    """
+    def dc_noisy(text, num):
+        return text.replace('</body>', ''.join(map(
+                lambda a: a.format(n=num), NOISE)) + '</body>')
+    def dc_bad(url):
+        def db_inner(text):
+            if relevant_digest(dc_noisy(text, 1)) != \
+                    relevant_digest(dc_noisy(text, 2)) or \
+                    relevant_digest(dc_noisy(text, 1)) != relevant_digest(text):
+                return True
+            if '<b>SB</b> - ' not in text:
+                return False
+            return relevant_digest(text) == relevant_digest(
+                    text.replace('<b>SB</b> - ', '<b>SB</b> - X. Extra (1), ',
+                                 1))
+        return db_inner(archive_read(url))
+    with use_archive(archive):
+        return list(filter(dc_bad, filter(lambda a: '/boxscore/' in a or
+                                          '.shtml' in a, archived_urls())))
+
+def record(source_archive, days, corpus=CORPUS):
+    """
+    Copy the scoreboards and box scores of days from a page archive into the
+    corpus.  Returns the number of pages copied.
+    """
+    with use_archive(source_archive):
+        urls = list(map(lambda a: CBS_DAY + f'{a}/', days)) + \
+               list(map(lambda a: BR_DAY + f'year={a[0:4]}&month={a[4:6]}' +
+                        f'&day={a[6:8]}', days)) + \
+               day_urls(cbs_get_box_urls, days) + \
+               day_urls(br_get_box_urls, days)
+        pages = list(filter(lambda a: a[1] is not None,
+                            map(lambda a: [a, archive_read(a)], urls)))
+    with use_archive(corpus):
+        list(map(lambda a: archive_write(*a), pages))
+    return len(pages)
+
+def main(argv):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='parser benchmarks')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--record', nargs='+', metavar=('ARCHIVE', 'DAY'),
+                        help='copy days from a page archive into the corpus')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--time-tolerance', type=float,
+                        default=TIME_TOLERANCE)
+    parser.add_argument('--parser', choices=PARSERS, default=None,
+                        help='html parser backend to benchmark')
+    parser.add_argument('--profile', nargs=2, metavar=('WEBSITE', 'URL'),
+                        help='profile one game of the corpus')
+    args = parser.parse_args(argv)
+    if args.parser:
+        set_parser(args.parser)
+    if args.profile:
+        with use_archive(args.corpus):
+            print(profile_game(box_read(args.profile[0]), args.profile[1]))
+        return 0
+    if args.record:
+        print(f'{record(args.record[0], args.record[1:], args.corpus)} '
+              'pages recorded')
+        return 0
+    bad_digests = digest_checks(args.corpus)
+    if finish(run_suite(args.repeat, args.corpus), BASELINE, args.save,
+              lambda a, b: compare(a, b, args.tolerance,
+                                   args.time_tolerance)):
+        return 1
+    if bad_digests:
+        print(f'relevant digest depends on page noise: {bad_digests}')
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
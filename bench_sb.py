@@ -0,0 +1,118 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Benchmark of the stolen base attribution stage over the CBS box scores in the
+page archive (the bench corpus by default).  The per-game index attribution
+in cbs_get_sb_info is timed against the original full-scan attribution (kept
+below for comparison) on the same inputs, and the two results are checked
+for agreement.  Only games the original attribution can handle are timed; if
+there are none, no timing or agreement is reported.
+
+usage: python bench_sb.py [archive directory] [repetitions]
+"""
+import sys
+import time
+
+from fetch_page import archived_urls, set_fetch_mode
+from bench_parsers import CORPUS
+from cbs_get_game_stats import get_raw_stats, fmt_bat, fmt_pit
+from cbs_get_sb_info import fmt_all_stats, stats_with_sb
+
+BOX_PREFIX = 'https://cbssports.com/mlb/gametracker/boxscore/'
+
+def legacy_wrap_sb(stats):
+    """
+    Original team detection: scan every batting line for each runner
+    """
+    def id_team_dups(tlist):
+        if len(tlist) == 1:
+            return tlist[0][0]
+        if len(tlist) == 0:
+            return tlist
+        return tlist[0]
+    def ws_chk_tm(splayers):
+        if len(stats[2]) == 2:
+            return [stats[0][0][1]['player']['team'],
+                    stats[0][-1][1]['player']['team']]
+        def chk_pl(one_pl):
+            def scan_plyrs(indiv):
+                if indiv[1]['player']['dispname'] == one_pl['name']:
+                    return indiv[1]['player']['team']
+                return []
+            return list(filter(lambda a: a, list(map(scan_plyrs, stats[0]))))
+        return list(filter(lambda a: len(a) == 1, list(map(chk_pl, splayers))))
+    return id_team_dups(list(map(ws_chk_tm, stats[2])))
+
+def legacy_fmt_all_stats(stats):
+    """
+    Original attribution: scan every batting line for each runner
+    """
+    def fas_inner(sb_teams):
+        def handle_sb(indx):
+            def conv_to_pstats(pdata):
+                def cscan(each_pl):
+                    if each_pl[1]['player']['dispname'] == pdata['name'] and \
+                            each_pl[1]['player']['team'] == sb_teams[indx]:
+                        return [each_pl[0], {'player': each_pl[1]['player']},
+                                {'baserunning': {'sb': pdata['sb']}}]
+                    return []
+                return list(filter(lambda a: a, list(map(cscan, stats[0]))))[0]
+            return list(map(conv_to_pstats, stats[2][indx]))
+        if len(sb_teams) == 0:
+            return []
+        if len(sb_teams) == 1:
+            return handle_sb(0)
+        return handle_sb(0) + handle_sb(1)
+    return [stats[0], stats[1], fas_inner(legacy_wrap_sb(stats))]
+
+def stage_inputs(url):
+    """
+    Input to the attribution stage for one recorded box score
+    """
+    def si_inner(raw_stats):
+        return [fmt_bat(raw_stats[1]), fmt_pit(raw_stats[1]),
+                stats_with_sb(raw_stats)]
+    return si_inner(get_raw_stats(url))
+
+def legacy_or_none(stats):
+    """
+    Legacy attribution, or None for games it cannot handle
+    """
+    try:
+        return legacy_fmt_all_stats(stats)[2]
+    except IndexError:
+        return None
+
+def time_stage(func, inputs, repeat):
+    """
+    Seconds taken to run func over every input repeat times
+    """
+    start = time.perf_counter()
+    list(map(lambda a: list(map(func, inputs)), range(repeat)))
+    return time.perf_counter() - start
+
+def run_bench(repeat):
+    """
+    Time both attribution stages and report
+    """
+    inputs = list(map(stage_inputs, archived_urls(BOX_PREFIX)))
+    if not inputs:
+        return 'no recorded box scores in the archive'
+    legacy = list(map(legacy_or_none, inputs))
+    usable = list(map(lambda a: a[0], filter(lambda a: a[1] is not None,
+                                             zip(inputs, legacy))))
+    agree = sum(map(lambda a: a[1] is not None and
+                    fmt_all_stats(a[0])[2] == a[1], zip(inputs, legacy)))
+    if not usable:
+        return f'games: {len(inputs)} (legacy fails on all of them)'
+    old_t = time_stage(legacy_fmt_all_stats, usable, repeat)
+    new_t = time_stage(fmt_all_stats, usable, repeat)
+    return '\n'.join([
+            f'games: {len(inputs)} (legacy fails on {len(inputs) - len(usable)})',
+            f'agreement: {agree}/{len(usable)}',
+            f'legacy: {1e6 * old_t / (len(usable) * repeat):.1f} us/game',
+            f'indexed: {1e6 * new_t / (len(usable) * repeat):.1f} us/game',
+            f'speedup: {old_t / new_t if new_t else float("inf"):.2f}x'])
+
+if __name__ == "__main__":
+    set_fetch_mode('offline', (sys.argv[1:2] or [CORPUS])[0])
+    print(run_bench(int((sys.argv[2:3] or ['20'])[0])))
@@ -0,0 +1,114 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Startup cost benchmark.
+
+Each case runs in a fresh interpreter: importing the command line driver
+and other entry modules, and a dry run of the driver (date generation and
+gap detection, nothing fetched).  The median wall time of each case and the
+heavy packages it loaded are reported and compared with the stored baseline
+(bench_startup_baseline.json).  A case that is slower than the baseline by
+more than the tolerance and by more than SLACK_MS, or a light case that
+loads a heavy package, is a regression; a few milliseconds either way is
+run to run noise for a fresh interpreter.  The checked-in baseline was taken
+on one machine; the heavy package checks carry over to others, the times
+only roughly.
+
+usage:
+    python bench_startup.py                 run and compare with baseline
+    python bench_startup.py --save          run and store a new baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from bench_common import finish, fmt_ratio, ratio
+
+BASELINE = 'bench_startup_baseline.json'
+TOLERANCE = 0.5
+SLACK_MS = 10.0
+HEAVY = ['pandas', 'numpy', 'bs4', 'lxml', 'requests']
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# [case name, statement, light (must not load a heavy package)]
+CASES = [
+    ['import_main', 'import main', True],
+    ['import_sources', 'import sources', True],
+    ['import_fetch_page', 'import fetch_page', True],
+    ['import_backfill', 'import backfill', True],
+    ['import_live', 'import live', True],
+    ['dry_run', 'import main, contextlib, io\n'
+     'with contextlib.redirect_stdout(io.StringIO()):\n'
+     '    main.main(["--dry-run", "--days", "0", "--start", "20230330", '
+     '"--end", "20231001"])', True],
+    ['import_parsers', 'import cbs_get_game_stats, baseb_ref', False],
+    ['import_http_client', 'import http_client', False],
+    ['import_season_agg', 'import season_agg', False],
+]
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, {here!r})
+start = time.perf_counter()
+exec({stmt!r})
+print(json.dumps([time.perf_counter() - start,
+                  sorted(set({heavy!r}) & set(sys.modules))]))
+'''
+
+def run_case(case, repeat):
+    """
+    Median seconds and heavy packages loaded for one case
+    """
+    def rc_once():
+        return json.loads(subprocess.run(
+                [sys.executable, '-c', PROBE.format(here=HERE, stmt=case[1],
+                                                    heavy=HEAVY)],
+                capture_output=True, text=True, check=True).stdout)
+    def rc_inner(runs):
+        return {'median_ms': 1e3 * statistics.median(map(lambda a: a[0],
+                                                         runs)),
+                'heavy': runs[-1][1], 'light': case[2]}
+    return rc_inner(list(map(lambda a: rc_once(), range(repeat))))
+
+def run_suite(repeat=5):
+    """
+    Results for every case
+    """
+    return {case[0]: run_case(case, repeat) for case in CASES}
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Lines comparing results with the baseline, and the list of regressions
+    """
+    def cmp_ratio(name):
+        return ratio(results, baseline, name, 'median_ms')
+    def fmt_line(name):
+        return (f'{name:20} {results[name]["median_ms"]:9.1f} ms '
+                f'x{fmt_ratio(cmp_ratio(name))} '
+                f'{" ".join(results[name]["heavy"]) or "-"}')
+    def regressed(name):
+        return (cmp_ratio(name) is not None and
+                cmp_ratio(name) > 1 + tolerance and
+                results[name]['median_ms'] - baseline[name]['median_ms'] >
+                SLACK_MS) or \
+               (results[name]['light'] and bool(results[name]['heavy']))
+    return ['\n'.join(map(fmt_line, results)),
+            list(filter(regressed, results))]
+
+def main(argv):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='startup benchmarks')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+    return finish(run_suite(args.repeat), BASELINE, args.save,
+                  lambda a, b: compare(a, b, args.tolerance))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
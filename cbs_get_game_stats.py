@@ -2,12 +2,10 @@
 """
 Return the stats for a game
 """
-from functools import reduce
-import requests
-from bs4 import BeautifulSoup as bs
-import pandas as pd
-
-from cbs_get_sb_info import fmt_all_stats, stats_with_sb
+from fetch_page import fetch_page
+from html_parse import make_soup
+from metrics import timed, timed_call
+from cbs_get_sb_info import fmt_all_stats, baserunning_info
 
 def cbs_get_box_urls(yyyymmdd):
     """
@@ -15,15 +13,16 @@ def cbs_get_box_urls(yyyymmdd):
     date.
     """
     def get_url_for_date(date_str):
-        return requests.get('https://www.cbssports.com/mlb/scoreboard/' +
-                            f'{date_str}/', timeout=15)
+        return fetch_page('https://www.cbssports.com/mlb/scoreboard/' +
+                          f'{date_str}/')
     def find_box(tag):
         if tag.has_attr('href'):
             if tag.get('href').startswith('/mlb/gametracker/boxscore/'):
                 return True
         return False
     def get_soup_on_date(yyyymmdd):
-        return bs(get_url_for_date(yyyymmdd).text, 'html.parser')
+        return timed_call('soup', make_soup, get_url_for_date(yyyymmdd),
+                          href=True)
     def get_games_on_day(yyyymmdd):
         return get_soup_on_date(yyyymmdd).find_all(find_box)
     def filter_asg(games):
@@ -33,46 +32,91 @@ def cbs_get_box_urls(yyyymmdd):
     return filter_asg(list(map(lambda a: ''.join(['https://cbssports.com',
                     a.get('href')]), get_games_on_day(yyyymmdd))))
 
+def cell_column(texts):
+    """
+    Convert the text of one table column the way pd.read_html would: all
+    integers become ints, all numbers become floats (blanks are NaN), and
+    anything else stays as text.
+    """
+    def as_numbers(conv):
+        try:
+            return list(map(lambda a: conv(a) if a else float('nan'), texts))
+        except ValueError:
+            return None
+    def cc_inner(numbers):
+        if numbers is None:
+            return texts
+        return numbers
+    if all(texts):
+        return cc_inner(as_numbers(int) or as_numbers(float))
+    return cc_inner(as_numbers(float))
+
+def table_rows(table):
+    """
+    Return a list of row dictionaries (keyed by the header row) for a box score
+    table
+    """
+    def cell_text(cell):
+        return ' '.join(cell.get_text().split())
+    def tr_inner(trows):
+        def tr_cols(header):
+            def tr_col(indx):
+                return cell_column(list(map(lambda a: a[indx], trows[1:])))
+            return list(map(tr_col, range(len(header))))
+        def tr_zip(header):
+            return list(map(lambda a: dict(zip(header, a)),
+                            zip(*tr_cols(header))))
+        if len(trows) < 2:
+            return []
+        return tr_zip(trows[0])
+    return tr_inner(list(map(lambda a: list(map(cell_text,
+                    a.find_all(['th', 'td']))), table.find_all('tr'))))
+
+def player_links(table):
+    """
+    Return [cbs id, {fullname, dispname}] for each player row in a box score
+    table
+    """
+    def fmt_plyr_link(ext_inf):
+        return [int(ext_inf[0][0]), {'fullname': ext_inf[0][1],
+                                     'dispname': ext_inf[1]}]
+    def get_href_text(in_soup):
+        def ght_inner(pinfo):
+            return fmt_plyr_link([pinfo['href'].split('/')[-3:-1], pinfo.text])
+        return ght_inner(in_soup.find("a"))
+    return list(map(get_href_text, table.find_all('tr')[1:]))
+
 def get_game_data(page):
     """
-    Extract the url data into a list of tables, a soup version, and a list of
-    team ids.
+    Download a box score once and walk its parse tree to extract the list of
+    player tables, the player links in those tables, a soup version, and a
+    list of team ids.
     """
-    def ggs_pd(pd_page):
-        if len(pd_page) < 8:
+    def ggs_tables(s_tables):
+        if len(s_tables) < 8:
             return []
-        return list(map(lambda a: pd_page[a], range(1,8,2)))
-    def ggs_soup():
-        return bs(requests.get(page, timeout=15).text, 'html.parser')
+        return list(map(lambda a: s_tables[a], range(1,8,2)))
     def ggs_tm_ids():
         def find_at(sparts):
             if '@' in sparts[-1]:
                 return sparts[-1]
             return sparts[-2]
         return find_at(page.strip('/').split('/')[-1].split('_')).split('@')
-    return {'tables': ggs_pd(pd.read_html(page)),
-            'soup': ggs_soup(), 'teams': ggs_tm_ids()}
+    def ggs_inner(soup):
+        def ggs_data(p_tables):
+            return {'tables': timed_call('tables', lambda: list(map(
+                        table_rows, p_tables))),
+                    'players': timed_call('tables', lambda: list(map(
+                        player_links, p_tables))),
+                    'soup': soup, 'teams': ggs_tm_ids()}
+        return ggs_data(ggs_tables(soup.find_all('table')))
+    return ggs_inner(timed_call('soup', make_soup, fetch_page(page)))
 
 def get_full_names_and_ids(game_data):
     """
     Extract player's full names and CBS player id's from the scraped data
     """
-    def fmt_plyr_link(ext_inf):
-        return [int(ext_inf[0][0]), {'fullname': ext_inf[0][1],
-                                     'dispname': ext_inf[1]}]
-    def get_ln_sn(ptable):
-        def get_href_text(in_soup):
-            def ght_inner(pinfo):
-                return fmt_plyr_link([pinfo['href'].split('/')[-3:-1], pinfo.text])
-            return ght_inner(in_soup.find("a"))
-        return list(map(get_href_text, ptable.find_all('tr')[1:]))
-    def get_links(s_links):
-        if len(s_links) < 8:
-            return []
-        return list(map(lambda a: s_links[a], range(1,8,2)))
-    def get_plr_info(soup):
-        return list(map(get_ln_sn, get_links(soup.find_all('table'))))
-    return get_plr_info(game_data['soup'])
+    return game_data['players']
 
 def lnk_stts(all_info):
     """
@@ -84,7 +128,7 @@ def lnk_stts(all_info):
         def lnk_pl(indiv):
             return [all_info[0][tbl_indx][indiv][0], {'player':
                     all_info[0][tbl_indx][indiv][1], stat_text(tbl_indx // 2):
-                    all_info[1]['tables'][tbl_indx].iloc[indiv].to_dict()}]
+                    all_info[1]['tables'][tbl_indx][indiv]}]
         return list(map(lnk_pl, list(range(len(all_info[0][tbl_indx])))))
     return [all_info[1], list(map(lnk_stts_inner, list(range(len(all_info[0])))))]
 
@@ -106,6 +150,7 @@ def get_raw_stats(page):
         return lnk_stts([add_teams(get_full_names_and_ids(game_data)), game_data])
     return gg_info(get_game_data(page))
 
+@timed('fmt_bat')
 def fmt_bat(raw_data):
     """
     Format batter statistics
@@ -123,6 +168,7 @@ def fmt_bat(raw_data):
         return list(map(fix_bat, raw_data[indx]))
     return ifmt_bat(0) + ifmt_bat(1)
 
+@timed('fmt_pit')
 def fmt_pit(raw_data):
     """
     Format pitching statistics
@@ -147,40 +193,59 @@ def fmt_pit(raw_data):
         return list(map(fix_pit, raw_data[indx]))
     return ifmt_pit(2) + ifmt_pit(3)
 
+class PlayerGame:  # pylint: disable=too-few-public-methods
+    """
+    One player's line for a game.  Each stat group holds the dict produced by
+    fmt_bat, fmt_pit or fmt_all_stats (None if the player has no such line).
+    """
+    __slots__ = ('player', 'batting', 'pitching', 'baserunning')
+
+    def __init__(self, player):
+        self.player = player
+        self.batting = None
+        self.pitching = None
+        self.baserunning = None
+
+    def to_dict(self):
+        """
+        Output (json) form of the line
+        """
+        return {'player': self.player} | {key: getattr(self, key)
+                for key in self.__slots__[1:] if getattr(self, key)
+                is not None}
+
+@timed('merge')
+def merge_lines(kdata):
+    """
+    Merge the batting, pitching and baserunning lines of a game (as returned by
+    fmt_all_stats) into one PlayerGame per player id, in a single pass
+    """
+    records = {}
+    def ml_line(group, line):
+        if line[0] not in records:
+            records[line[0]] = PlayerGame(line[1]['player'])
+        setattr(records[line[0]], group, line[2][group])
+    list(map(lambda a: list(map(lambda b: ml_line(a[0], b), a[1])),
+             zip(PlayerGame.__slots__[1:], kdata)))
+    return records
+
 def extract_game_stats(page):
     """
     Main data extraction call
     """
     def xtract_game_stats(page):
         def xgs_inner(raw_stats):
-            return fmt_all_stats([fmt_bat(raw_stats[1]),
-                              fmt_pit(raw_stats[1])] +
-                              [stats_with_sb(raw_stats)])
+            try:
+                return fmt_all_stats([fmt_bat(raw_stats[1]),
+                                      fmt_pit(raw_stats[1])] +
+                                     baserunning_info(raw_stats))
+            finally:
+                raw_stats[0]['soup'].decompose()
         return xgs_inner(get_raw_stats(page))
-    def reorg(rdata):
-        def reorg1(stat_group):
-            def reorg2(indv):
-                return [indv[0], indv[1] | indv[2]]
-            return list(map(reorg2, stat_group))
-        return list(map(reorg1, rdata))
-    def xtract_ids(kdata):
-        def xtract_ids2(kdata2):
-            return list(map(lambda a: a[0], kdata2))
-        return list(map(xtract_ids2, kdata))
-    def gg_stats_inner(kdata):
-        def mrg_stats(indv_id):
-            def mrg_stats2(lin_data):
-                def mrg_stts3(indvs):
-                    if indvs[0] == indv_id:
-                        return indvs[1]
-                    return {}
-                return [indv_id, reduce(lambda a, b : a | b, list(filter(
-                        lambda a: a, list(map(mrg_stts3, lin_data)))), {})]
-            return mrg_stats2(kdata[0] + kdata[1] + kdata[2])
-        def gg_si2(id_value):
-            return list(set(id_value[0] + id_value[1] + id_value[2]))
-        return list(map(mrg_stats, gg_si2(xtract_ids(kdata))))
-    return dict(gg_stats_inner(reorg(xtract_game_stats(page))))
+    def gg_stats_inner(records):
+        return {indv_id: records[indv_id].to_dict()
+                for indv_id in list(set(records))}
+    return gg_stats_inner(merge_lines(xtract_game_stats(page)))
 
 def cbs_get_game_stats(url):
     """
@@ -1,11 +1,25 @@
 # Copyright (C) 2023 Warren Usui, MIT License
 """
 Stolen base data extraction.  This really seems bigger than it should be.
+
+Runners listed in the SB (stolen base) and CS (caught stealing) sections of a
+boxscore are attributed to batting lines through a per-game index keyed by
+(team, display name), built once per game.
 """
+from functools import reduce
+
+from metrics import add_count, timed
 
-def extract_sb(raw_soup):
+def soup_text(raw_soup):
     """
-    Find stolen base text in boxsocre
+    All text in a boxscore joined with '|' separators
+    """
+    return '|'.join(raw_soup.find_all(text=True))
+
+def extract_sb(raw_soup, label='SB'):
+    """
+    Find stolen base text in boxsocre (or caught stealing text if label is
+    'CS').  raw_soup may also be text already returned by soup_text.
     """
     def iex_sb(sb_data):
         if len(sb_data) == 0:
@@ -13,72 +27,156 @@ def extract_sb(raw_soup):
         if len(sb_data) == 2:
             return [sb_data[0]]
         return sb_data[0:2]
+    def ex_text():
+        if isinstance(raw_soup, str):
+            return raw_soup
+        return soup_text(raw_soup)
     return list(map(lambda a: a.split('|')[0],
-            iex_sb('|'.join(raw_soup.find_all(text=True)).split('|SB| - ')[1:])))
+            iex_sb(ex_text().split(f'|{label}| - ')[1:])))
+
+def split_runners(plist):
+    """
+    Split a comma separated runner list, ignoring commas inside parentheses
+    (for example 'A. Smith 2 (10, 2nd base off B. Jones/C. Ruiz)')
+    """
+    def sr_step(state, chr_v):
+        if chr_v == ',' and state[1] == 0:
+            return [state[0] + [''], 0]
+        return [state[0][:-1] + [state[0][-1] + chr_v],
+                state[1] + {'(': 1, ')': -1}.get(chr_v, 0)]
+    if '(' not in plist:
+        return plist.split(',')
+    return reduce(sr_step, plist, [[''], 0])[0]
+
+def fmt_runners(extracted, key):
+    """
+    Convert extracted runner text to lists (one per team section) of
+    {'name': display name, key: count} entries.  A count follows the name
+    when a runner has more than one ('A. Smith 2 (10)').
+    """
+    def rfmt_sb(plist):
+        def indv_sb(runner):
+            def indv_fmt(name_v):
+                def indv_fmt1(nm_numv):
+                    if nm_numv.isnumeric():
+                        return {'name': ' '.join(name_v.split()[0:-1]),
+                                key: int(nm_numv)}
+                    return {'name': name_v, key: 1}
+                return indv_fmt1(name_v.split()[-1])
+            return indv_fmt(runner.split('(')[0].strip())
+        return list(map(indv_sb, filter(lambda a: a.split('(')[0].strip(),
+                                        split_runners(plist))))
+    return list(map(rfmt_sb, extracted))
 
-def stats_with_sb(raw_stats):
+def stats_with_sb(raw_stats, label='SB'):
     """
     Return stolen base info in away/home order.  Return one entry if only one
     team stole any bases.  Called from cbs_get_game_stats
     """
-    def fmt_sb(extracted_sb):
-        def sb_list():
-            def rfmt_sb(plist):
-                def indv_sb(runner):
-                    def indv_fmt(name_v):
-                        def indv_fmt1(nm_numv):
-                            if nm_numv.isnumeric():
-                                return {'name': ' '.join(name_v.split()[0:-1]),
-                                        'sb': int(nm_numv)}
-                            return {'name': name_v, 'sb': 1}
-                        return indv_fmt1(name_v.split()[-1])
-                    return indv_fmt(runner.split('(')[0].strip())
-                return list(map(indv_sb, plist.split(',')))
-            return list(map(rfmt_sb, extracted_sb))
-        return sb_list()
-    return fmt_sb(extract_sb(raw_stats[0]['soup']))
+    return fmt_runners(extract_sb(raw_stats[0]['soup'], label), label.lower())
+
+def stats_with_cs(raw_stats):
+    """
+    Return caught stealing info, laid out like stats_with_sb
+    """
+    return stats_with_sb(raw_stats, 'CS')
+
+@timed('baserunning')
+def baserunning_info(raw_stats):
+    """
+    Stolen base and caught stealing info for a game, reading the boxscore
+    text only once
+    """
+    def bi_inner(text):
+        return [fmt_runners(extract_sb(text, 'SB'), 'sb'),
+                fmt_runners(extract_sb(text, 'CS'), 'cs')]
+    return bi_inner(soup_text(raw_stats[0]['soup']))
+
+def player_index(plines):
+    """
+    Index batting lines by (team, display name), and display names by the
+    teams that have a player with that name
+    """
+    def pi_inner(index):
+        list(map(lambda a: index[0].setdefault(
+                (a[1]['player']['team'], a[1]['player']['dispname']), a),
+                plines))
+        list(map(lambda a: index[1].setdefault(a[1], []).append(a[0]),
+                 index[0]))
+        return index
+    return pi_inner([{}, {}])
+
+def section_teams(sections, plines, index):
+    """
+    Team of each runner section.  Two sections are away and home.  A single
+    section belongs to the team every identifiable runner plays for, using
+    runners whose display name is unique to one team first.
+    """
+    def st_one(section):
+        def st_cands(teams):
+            if not teams:
+                return []
+            return [sorted(set.intersection(*teams))]
+        def st_pick(unique, shared):
+            if unique:
+                return [unique[0]]
+            if shared and len(shared[0]) == 1:
+                return shared[0]
+            return []
+        def st_inner(teams):
+            return st_pick(list(map(lambda a: a[0],
+                                    filter(lambda a: len(a) == 1, teams))),
+                           st_cands(list(map(set, teams))))
+        return st_inner(list(filter(None, map(
+                lambda a: index[1].get(a['name'], []), section))))
+    if len(sections) == 2:
+        return [plines[0][1]['player']['team'],
+                plines[-1][1]['player']['team']]
+    if len(sections) == 1:
+        return st_one(sections[0])
+    return []
 
 def wrap_sb(stats):
     """
     Wrap display of stolen base statistics for fmt_all_stats
     """
-    def id_team_dups(tlist):
-        if len(tlist) == 1:
-            return tlist[0][0]
-        if len(tlist) == 0:
-            return tlist
-        return tlist[0]
-    def ws_chk_tm(splayers):
-        if len(stats[2]) == 2:
-            return [stats[0][0][1]['player']['team'],
-                    stats[0][-1][1]['player']['team']]
-        def chk_pl(one_pl):
-            def scan_plyrs(indiv):
-                if indiv[1]['player']['dispname'] == one_pl['name']:
-                    return indiv[1]['player']['team']
-                return []
-            return list(filter(lambda a: a, list(map(scan_plyrs, stats[0]))))
-        return list(filter(lambda a: len(a) == 1, list(map(chk_pl, splayers))))
-    return id_team_dups(list(map(ws_chk_tm, stats[2])))
+    return section_teams(stats[2], stats[0], player_index(stats[0]))
 
+@timed('fmt_all_stats')
 def fmt_all_stats(stats):
     """
-    Format baserunning entry and add to player's stats
-    """
-    def fas_inner(sb_teams):
-        def handle_sb(indx):
-            def conv_to_pstats(pdata):
-                def cscan(each_pl):
-                    if each_pl[1]['player']['dispname'] == pdata['name'] and \
-                            each_pl[1]['player']['team'] == sb_teams[indx]:
-                        return [each_pl[0], {'player': each_pl[1]['player']},
-                                {'baserunning': {'sb': pdata['sb']}}]
-                    return []
-                return list(filter(lambda a: a, list(map(cscan, stats[0]))))[0]
-            return list(map(conv_to_pstats, stats[2][indx]))
-        if len(sb_teams) == 0:
-            return []
-        if len(sb_teams) == 1:
-            return handle_sb(0)
-        return handle_sb(0) + handle_sb(1)
-    return [stats[0], stats[1], fas_inner(wrap_sb(stats))]
+    Format baserunning entries (stolen bases in stats[2], and caught stealing
+    in stats[3] if present) and add them to player's stats.  A runner not
+    found under its section's team is looked up by display name alone when
+    only one team has a player with that name.  Runners that still cannot be
+    found are dropped and counted (runners_dropped in the game's metrics).
+    """
+    index = player_index(stats[0])
+    def fas_label(sections):
+        def fas_sect(sect_team):
+            def fas_runner(pdata):
+                def fr_inner(pline):
+                    if pline is None:
+                        add_count('runners_dropped')
+                        return []
+                    return [[pline[0], pline[1]['player'],
+                             {key: pdata[key] for key in pdata
+                              if key != 'name'}]]
+                def fr_any_team(teams):
+                    if len(teams) != 1:
+                        return None
+                    return index[0][(teams[0], pdata['name'])]
+                return fr_inner(index[0].get((sect_team[1], pdata['name'])) or
+                                fr_any_team(index[1].get(pdata['name'], [])))
+            return sum(map(fas_runner, sect_team[0]), [])
+        return sum(map(fas_sect, zip(sections, section_teams(
+                sections, stats[0], index) + [None] * len(sections))), [])
+    def fas_merge(entries):
+        def fm_inner(merged):
+            list(map(lambda a: merged.setdefault(
+                    a[0], [a[0], {'player': a[1]}, {'baserunning': {}}]
+                    )[2]['baserunning'].update(a[2]), entries))
+            return list(merged.values())
+        return fm_inner({})
+    return [stats[0], stats[1],
+            fas_merge(sum(map(fas_label, stats[2:]), []))]
@@ -0,0 +1,165 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Manifest of saved days.  Each website's stats directory holds a
+manifest.json recording, for every day that was attempted, its status,
+game count and the sha256 of its day file:
+
+    complete  -- every game was saved
+    partial   -- some games failed; the day file holds the others
+    failed    -- nothing could be saved (no day file is written)
+    no_games  -- the scoreboard had no games (an empty day file is written)
+
+Day files and the manifest are written to a temporary file and renamed into
+place, so an interrupted run never leaves a truncated file.  Gap detection is
+a dictionary lookup per day instead of a file check.
+
+Several processes (a live poller and a backfill, say) may mark days at the
+same time, so a day is marked by re-reading the manifest under an exclusive
+lock on manifest.json.lock, adding the entry and writing it back; no
+process's entries are lost.
+"""
+from datetime import datetime
+import hashlib
+import json
+import os
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from sources import statdir
+
+DONE = ['complete', 'no_games']
+MANIFESTS = {'lock': threading.Lock()}
+
+def manifest_file(website):
+    """
+    Location of a website's manifest
+    """
+    return os.sep.join([statdir(website), 'manifest.json'])
+
+def write_text_atomic(fname, text):
+    """
+    Write text to a temporary file and rename it into place.  Returns the
+    sha256 of the text.
+    """
+    os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+    tmpf = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmpf, 'w', encoding='utf-8') as ofd:
+        ofd.write(text)
+    os.replace(tmpf, fname)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def update_json(fname, update, fallback):
+    """
+    Re-read a json file while holding an exclusive lock on fname.lock, let
+    update change the data in place, and write it back if update returns
+    True.  fallback() supplies the data when the file is missing or
+    unreadable.  Returns the data.
+    """
+    os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+    with open(f'{fname}.lock', 'a', encoding='utf-8') as lfd:
+        if fcntl is not None:
+            fcntl.flock(lfd, fcntl.LOCK_EX)
+        try:
+            with open(fname, 'r', encoding='utf-8') as ifd:
+                data = json.load(ifd)
+        except (OSError, ValueError):
+            data = fallback()
+        if update(data):
+            write_text_atomic(fname, json.dumps(data, indent=1,
+                                                sort_keys=True))
+        return data
+
+def scan_entry(fname):
+    """
+    Manifest entry for a day file saved before there was a manifest.  Files
+    that are empty or not valid json (left by an interrupted run) are failed.
+    """
+    try:
+        with open(fname, 'r', encoding='utf-8') as ifd:
+            text = ifd.read()
+        games = len(json.loads(text))
+    except (OSError, ValueError):
+        return {'status': 'failed', 'games': 0, 'sha256': None}
+    return {'status': ['no_games', 'complete'][int(games > 0)],
+            'games': games,
+            'sha256': hashlib.sha256(text.encode('utf-8')).hexdigest()}
+
+def rebuild_manifest(website):
+    """
+    Build a manifest from the day files in a website's stats directory
+    """
+    def rm_inner(fnames):
+        return {fname[1:9]: scan_entry(os.sep.join([statdir(website), fname]))
+                for fname in fnames}
+    if not os.path.isdir(statdir(website)):
+        return {}
+    return rm_inner(sorted(filter(
+            lambda a: a.startswith('a') and a.endswith('.json') and
+            len(a) == 14, os.listdir(statdir(website)))))
+
+def load_manifest(website):
+    """
+    A website's manifest (read once per process, or rebuilt from the day
+    files if there is none yet)
+    """
+    with MANIFESTS['lock']:
+        if website not in MANIFESTS:
+            MANIFESTS[website] = read_manifest(website)
+        return MANIFESTS[website]
+
+def read_manifest(website):
+    """
+    Read a manifest file, falling back to a scan of the day files
+    """
+    try:
+        with open(manifest_file(website), 'r', encoding='utf-8') as ifd:
+            return json.load(ifd)
+    except (OSError, ValueError):
+        return rebuild_manifest(website)
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def mark_day(website, day, status, games=0, sha256=None, failed=None,
+             urls=None):
+    """
+    Record a day's status and save the manifest (merged with the entries
+    other processes saved since it was read).  urls are the box scores
+    saved in the day file, in the order they were saved.
+    """
+    entry = {'status': status, 'games': games, 'sha256': sha256,
+             'updated': datetime.now().isoformat(timespec='seconds')} | \
+            ({'failed': failed} if failed else {}) | \
+            ({'urls': urls} if urls is not None else {})
+    def md_update(manifest):
+        manifest[day] = entry
+        return True
+    with MANIFESTS['lock']:
+        MANIFESTS.setdefault(website, {}).update(update_json(
+                manifest_file(website), md_update,
+                lambda: rebuild_manifest(website)))
+    return entry
+
+def day_status(website, day):
+    """
+    Status of a day (None if it was never attempted)
+    """
+    return load_manifest(website).get(day, {}).get('status')
+
+def manifest_gaps(website, dates):
+    """
+    Days in dates that are not complete: never attempted, failed or partial
+    """
+    def mg_inner(manifest):
+        return list(filter(lambda a: manifest.get(a, {}).get('status')
+                           not in DONE, dates))
+    return mg_inner(load_manifest(website))
+
+def days_with_status(website, statuses):
+    """
+    Sorted days whose status is one of statuses
+    """
+    return sorted(map(lambda a: a[0], filter(
+            lambda a: a[1]['status'] in statuses,
+            load_manifest(website).items())))
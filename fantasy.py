@@ -0,0 +1,195 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Fantasy scoring over the season store.
+
+A scheme is either points (a weight per stat, summed over a player's lines)
+or categories (rotisserie: within each period every player is ranked in each
+category and earns their average rank, 1 for the worst, as points).  Schemes
+are given by name (SCHEMES), as a dict, or as the name of a json file
+holding one.
+
+The player-game lines of a date range are read once into numpy columns
+(game_lines) and can then be scored under any number of schemes.  Each
+scoring is one grouped sum over all lines per period (day, week starting on
+Monday, or season) followed by array arithmetic, so re-scoring a season
+costs milliseconds.
+
+usage:
+    python fantasy.py START END [--source cbs] [--scheme points]
+                      [--period season] [--count 20]
+"""
+import argparse
+import json
+import numpy as np
+
+from season_store import BAT_COLS, PIT_COLS, read_range
+from season_agg import group_sums, line_matrix, sums_table
+
+PERIODS = ['day', 'week', 'season']
+SCHEMES = {
+    'points': {'kind': 'points',
+               'points': {'R': 1, 'H': 1, 'HR': 4, 'RBI': 1, 'SB': 2,
+                          'Outs': 1, 'WH': -1, 'ER': -2, 'SO': 1, 'Win': 5,
+                          'Save': 5}},
+    'roto5x5': {'kind': 'categories',
+                'categories': ['R', 'HR', 'RBI', 'SB', 'AVG', 'Win', 'Save',
+                               'SO', 'ERA', 'WHIP'],
+                'lower': ['ERA', 'WHIP']},
+}
+
+def load_scheme(scheme):
+    """
+    A scoring scheme from its name in SCHEMES, a json file name, or a dict
+    """
+    if isinstance(scheme, dict):
+        return scheme
+    if scheme in SCHEMES:
+        return SCHEMES[scheme]
+    with open(scheme, 'r', encoding='utf-8') as ifd:
+        return json.load(ifd)
+
+def game_lines(start, end, source='cbs', conn=None):
+    """
+    Player-game lines for days start through end (yyyymmdd) as a dict of
+    numpy arrays
+    """
+    def gl_inner(lines):
+        return {col: np.asarray(lines[col], dtype=str)
+                for col in ['day', 'player', 'name', 'team']} | \
+               {col: np.asarray(lines[col], dtype=np.int64)
+                for col in BAT_COLS + PIT_COLS}
+    return gl_inner(read_range(start, end, source, ['day', 'player', 'name',
+                    'team'] + BAT_COLS + PIT_COLS, conn))
+
+def period_keys(days, period):
+    """
+    Period of each yyyymmdd day: the day, the Monday starting its week, or
+    its year
+    """
+    def pk_week(dates):
+        return np.datetime_as_string(dates - (dates.astype(np.int64) + 3) % 7
+                                     ).astype('U10')
+    if period == 'day':
+        return days
+    if period == 'season':
+        return days.astype('U4')
+    return np.char.replace(pk_week(np.asarray(
+            list(map(lambda a: f'{a[0:4]}-{a[4:6]}-{a[6:8]}', days)),
+            dtype='datetime64[D]')), '-', '')
+
+def period_table(lines, period):
+    """
+    Summed stats and rates per player per period
+    """
+    def pt_inner(keys):
+        def pt_table(first):
+            return sums_table(*group_sums(keys, line_matrix(lines))) | {
+                    'player': lines['player'][first],
+                    'name': lines['name'][first],
+                    'team': lines['team'][first],
+                    'period': periods[first]}
+        return pt_table(np.unique(keys, return_index=True)[1])
+    periods = period_keys(lines['day'], period)
+    return pt_inner(np.char.add(np.char.add(periods, '|'), lines['player']))
+
+def group_ranks(groups, values, lower=False):
+    """
+    Average rank of each value among the rows of its group, 1 being the
+    worst (the highest value if lower is set).  groups are integer codes.
+    NaN values are not ranked and get 0.
+    """
+    def gr_inner(order, vals):
+        def gr_runs(new_group, new_run):
+            pos = np.arange(len(order))
+            run_id = np.cumsum(new_run) - 1
+            run_end = np.append(pos[new_run][1:], len(order)) - 1
+            ranks = np.empty(len(order))
+            ranks[order] = (pos[new_run][run_id] + run_end[run_id]) / 2 - \
+                    np.maximum.accumulate(np.where(new_group, pos, 0)) + 1
+            return np.where(np.isnan(values), 0.0, ranks - np.bincount(
+                    groups, weights=np.isnan(values))[groups])
+        new_group = np.append(True, groups[order][1:] != groups[order][:-1])
+        return gr_runs(new_group, new_group | np.append(
+                True, vals[order][1:] != vals[order][:-1]))
+    def gr_vals(vals):
+        return gr_inner(np.lexsort((vals, groups)), vals)
+    return gr_vals(np.where(np.isnan(values), -np.inf,
+                            -values if lower else values))
+
+def points_scores(table, scheme):
+    """
+    Points for each row of a period table
+    """
+    return {'points': sum(map(lambda a: a[1] * table[a[0]].astype(float),
+                              scheme['points'].items()),
+                          np.zeros(len(table['player'])))}
+
+def category_scores(table, scheme):
+    """
+    Category rank points, and their total, for each row of a period table
+    """
+    def cs_inner(groups):
+        def cs_inner2(ranks):
+            return ranks | {'points': sum(ranks.values(),
+                                          np.zeros(len(groups)))}
+        return cs_inner2({f'{cat}_pts': group_ranks(
+                groups, np.asarray(table[cat], dtype=float),
+                cat in scheme.get('lower', []))
+                for cat in scheme['categories']})
+    return cs_inner(np.unique(table['period'], return_inverse=True)[1])
+
+def score(lines, scheme='points', period='day'):
+    """
+    Score lines (from game_lines) under a scheme for one period type.
+    Returns a table (dict of arrays) ordered by period, then by points from
+    highest.
+    """
+    def s_inner(table):
+        def s_order(order):
+            return {col: table[col][order] for col in table}
+        return s_order(np.lexsort((-table['points'], table['period'])))
+    def s_table(table, spec):
+        if spec['kind'] == 'points':
+            return table | points_scores(table, spec)
+        return table | category_scores(table, spec)
+    return s_inner(s_table(period_table(lines, period), load_scheme(scheme)))
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def score_range(start, end, scheme='points', source='cbs',
+                periods=None, conn=None):
+    """
+    {period type: scored table} for days start through end
+    """
+    def sr_inner(lines):
+        return {period: score(lines, scheme, period)
+                for period in periods or PERIODS}
+    return sr_inner(game_lines(start, end, source, conn))
+
+def fmt_rows(table, count):
+    """
+    Printable lines for the first count rows of a scored table
+    """
+    return list(map(lambda a: f'{table["period"][a]:10} ' +
+                    f'{table["name"][a]:25} {table["team"][a]:4} ' +
+                    f'{table["points"][a]:8.1f}',
+                    range(min(count, len(table['player'])))))
+
+def main(argv=None):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='fantasy scoring')
+    parser.add_argument('start', help='first day (yyyymmdd)')
+    parser.add_argument('end', help='last day (yyyymmdd)')
+    parser.add_argument('--source', choices=['cbs', 'br'], default='cbs')
+    parser.add_argument('--scheme', default='points',
+                        help='scheme name or json file (default points)')
+    parser.add_argument('--period', choices=PERIODS, default='season')
+    parser.add_argument('--count', type=int, default=20)
+    args = parser.parse_args(argv)
+    print('\n'.join(fmt_rows(score(game_lines(args.start, args.end,
+                                              args.source), args.scheme,
+                                   args.period), args.count)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Shared page fetch layer.  Every raw page read is saved in a compressed,
+content-addressed archive keyed by url, so that whole seasons can be
+re-parsed from disk (offline replay) without touching the network.
+
+Modes:
+    live    -- always download, archive what was read (default)
+    cache   -- use the archived copy if there is one, otherwise download
+    offline -- only use the archive; a missing page is an error
+
+Pages placed in PAGE_MEMO by a caller that already holds their text are
+served from memory in every mode.  revalidate checks an archived page
+against the website with a conditional request.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+from metrics import add_count, timed_call
+
+FETCH_MODES = ['live', 'cache', 'offline']
+FETCH_CONFIG = {'mode': os.environ.get('YAROTOBALL_FETCH_MODE', 'live'),
+                'archive': os.environ.get('YAROTOBALL_ARCHIVE', 'raw_html')}
+PAGE_MEMO = {}
+
+def set_fetch_mode(mode, archive=None):
+    """
+    Select the fetch mode (and optionally the archive directory)
+    """
+    if mode not in FETCH_MODES:
+        raise ValueError(f'fetch mode must be one of {FETCH_MODES}')
+    FETCH_CONFIG['mode'] = mode
+    if archive:
+        FETCH_CONFIG['archive'] = archive
+    return FETCH_CONFIG
+
+def digest(data):
+    """
+    sha256 hex digest of a string
+    """
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def arch_path(kind, key, suffix):
+    """
+    Location of an archive entry.  Entries are fanned out over 256
+    subdirectories by the first two characters of their key.
+    """
+    return os.sep.join([FETCH_CONFIG['archive'], kind, key[0:2],
+                        f'{key}{suffix}'])
+
+def write_atomic(fname, data):
+    """
+    Write bytes to a temporary file and rename it into place so that readers
+    never see a partial entry
+    """
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    tmpf = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmpf, 'wb') as ofd:
+        ofd.write(data)
+    os.replace(tmpf, fname)
+
+def archive_ref(url):
+    """
+    Return the archive reference record for a url (None if not archived)
+    """
+    def ar_inner(fname):
+        if not os.path.exists(fname):
+            return None
+        with open(fname, 'r', encoding='utf-8') as ifd:
+            return json.load(ifd)
+    return ar_inner(arch_path('urls', digest(url), '.json'))
+
+def archive_read(url):
+    """
+    Return the archived text of a url (None if not archived)
+    """
+    def ard_inner(ref):
+        if ref is None:
+            return None
+        with gzip.open(arch_path('objects', ref['sha256'], '.html.gz'),
+                       'rt', encoding='utf-8') as ifd:
+            return ifd.read()
+    return ard_inner(archive_ref(url))
+
+def archive_write(url, text, headers_kept=None):
+    """
+    Save the text read from a url (with the response's cache validators).
+    Page bodies are stored once per distinct content; the url reference points
+    at the current content.
+    """
+    def aw_inner(content_key):
+        obj = arch_path('objects', content_key, '.html.gz')
+        if not os.path.exists(obj):
+            write_atomic(obj, gzip.compress(text.encode('utf-8')))
+        write_atomic(arch_path('urls', digest(url), '.json'),
+                     json.dumps({'url': url, 'sha256': content_key,
+                                 'size': len(text)} |
+                                (headers_kept or {})).encode('utf-8'))
+        return text
+    return aw_inner(digest(text))
+
+def validators(headers):
+    """
+    ETag and Last-Modified values of a response, if it sent them
+    """
+    return {key: headers[hdr] for key, hdr in [['etag', 'ETag'],
+            ['last_modified', 'Last-Modified']] if headers.get(hdr)}
+
+def net_read(url, headers=None):
+    """
+    Download a page (through the rate limited client) and archive it.
+    Returns the response.  Only successful (2xx) bodies are archived, so
+    replay never serves an error page; a 4xx or 5xx response raises
+    requests.HTTPError.
+    """
+    from http_client import http_get  # pylint: disable=import-outside-toplevel
+    def nr_inner(response):
+        add_count('bytes', len(response.content))
+        if response.status_code == 304:
+            return response
+        response.raise_for_status()
+        if 200 <= response.status_code < 300:
+            archive_write(url, response.text, validators(response.headers))
+        return response
+    return nr_inner(timed_call('fetch', http_get, url, headers))
+
+def relevant_digest(text):
+    """
+    sha256 of the parts of a box score the parsers read: its tables
+    (including those inside baseball-reference comments) and the SB/CS
+    runner lines (the text node after each SB or CS label)
+    """
+    return digest('\n'.join(re.findall(r'<table.*?</table>', text, re.S) +
+                            re.findall(r'>\s*(?:SB|CS)\s*</[^>]+>\s*-[^<]*',
+                                       text)))
+
+def revalidate(url):
+    """
+    Check an archived page against the website.  A conditional request is
+    sent when the archive has validators for the page (a 304 costs no
+    download); otherwise the page is downloaded and the digest of its
+    relevant parts compared.  Returns [changed, text], text being None when
+    the page is unchanged.
+    """
+    def rv_inner(ref, old_text):
+        def rv_compare(response):
+            if response.status_code == 304:
+                return [False, None]
+            if old_text is not None and \
+                    relevant_digest(old_text) == relevant_digest(response.text):
+                return [False, None]
+            return [True, response.text]
+        return rv_compare(net_read(url, {
+                hdr: ref[key] for key, hdr in [['etag', 'If-None-Match'],
+                ['last_modified', 'If-Modified-Since']] if key in ref}))
+    return rv_inner(archive_ref(url) or {}, archive_read(url))
+
+def preload_pages(urls):
+    """
+    Hold archived pages in memory so that replaying them does not read the
+    disk (used for benchmarks).  Returns the number of pages held.
+    """
+    PAGE_MEMO.update(filter(lambda a: a[1] is not None,
+                            map(lambda a: [a, archive_read(a)], urls)))
+    return len(PAGE_MEMO)
+
+def fetch_page(url):
+    """
+    Return the text of a page, honoring the current fetch mode
+    """
+    if url in PAGE_MEMO:
+        return PAGE_MEMO[url]
+    if FETCH_CONFIG['mode'] == 'live':
+        return net_read(url).text
+    def fp_archived(text):
+        if text is not None:
+            return text
+        if FETCH_CONFIG['mode'] == 'offline':
+            raise LookupError(f'{url} is not in the page archive')
+        return net_read(url).text
+    return fp_archived(timed_call('archive', archive_read, url))
+
+def archived_urls(prefix=''):
+    """
+    Sorted list of the archived urls that start with prefix
+    """
+    def au_ref(fname):
+        with open(fname, 'r', encoding='utf-8') as ifd:
+            return json.load(ifd)['url']
+    def au_dir(subdir):
+        return list(map(lambda a: au_ref(os.sep.join([subdir, a])),
+                        filter(lambda a: a.endswith('.json'),
+                               os.listdir(subdir))))
+    def au_inner(top):
+        if not os.path.isdir(top):
+            return []
+        return sorted(filter(lambda a: a.startswith(prefix), sum(map(
+                au_dir, map(lambda a: os.sep.join([top, a]),
+                            os.listdir(top))), [])))
+    return au_inner(os.sep.join([FETCH_CONFIG['archive'], 'urls']))
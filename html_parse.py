@@ -0,0 +1,76 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+HTML parser backend for the scrapers.
+
+BeautifulSoup builds the same trees for these pages with either lxml or
+python's html.parser, but lxml is several times faster, so it is used when
+it is installed.  YAROTOBALL_PARSER (or set_parser) selects a backend
+explicitly.
+
+make_soup can also build only the tags a caller needs (all links, say),
+and comment_tables and page_title pull the commented-out tables and the
+title of a Baseball-Reference page out of the text without parsing the
+rest of it.
+"""
+import html
+import importlib.util
+import os
+import re
+
+PARSERS = ['lxml', 'html.parser']
+COMMENT = re.compile(r'<!--(.*?)-->', re.S)
+TITLE = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+
+def default_parser():
+    """
+    lxml if it is installed, otherwise html.parser
+    """
+    if importlib.util.find_spec('lxml') is None:
+        return 'html.parser'
+    return 'lxml'
+
+PARSER_CONFIG = {'backend': os.environ.get('YAROTOBALL_PARSER') or
+                 default_parser()}
+
+def set_parser(backend):
+    """
+    Select the parser backend (one of PARSERS)
+    """
+    if backend not in PARSERS:
+        raise ValueError(f'unknown parser {backend}')
+    PARSER_CONFIG['backend'] = backend
+    return backend
+
+def make_soup(text, names=None, **attrs):
+    """
+    Parse text with the selected backend.  If tag names or attributes are
+    given, only the matching tags (with their contents) are built.
+    """
+    # pylint: disable=import-outside-toplevel
+    from bs4 import BeautifulSoup as bs, SoupStrainer
+    if names is None and not attrs:
+        return bs(text, PARSER_CONFIG['backend'])
+    return bs(text, PARSER_CONFIG['backend'],
+              parse_only=SoupStrainer(names, **attrs))
+
+def comment_tables(text, count=None):
+    """
+    Html comments of a page that hold tables, in page order (only the first
+    count of them if count is set)
+    """
+    def ct_inner(found):
+        if count is None:
+            return found
+        return found[0:count]
+    return ct_inner(list(filter(lambda a: '<table' in a,
+                                COMMENT.findall(text))))
+
+def page_title(text):
+    """
+    Text of a page's title tag
+    """
+    def pt_inner(found):
+        if found is None:
+            raise LookupError('page has no title')
+        return html.unescape(found.group(1))
+    return pt_inner(TITLE.search(text))
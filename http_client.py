@@ -0,0 +1,208 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Shared HTTP client for cbssports.com and baseball-reference.com.
+
+Requests go through one pooled keep-alive session.  Each site has a token
+bucket rate limit (rate requests per second, up to burst at once); a site's
+host names with and without www. share one bucket.  429 and 5xx responses
+are retried with backoff, honoring Retry-After.  A 429 holds back the whole
+site's bucket for the delay, not only the request that received it.  Time
+spent waiting on the limiter, backing off, and on the wire is tallied per
+site; waiting out a 429 is limiter time, only the sleeps before other
+retries are backoff.
+"""
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import add_count
+
+HOST_POLICY = {
+    'cbssports.com': {'rate': 2.0, 'burst': 4},
+    'baseball-reference.com': {'rate': 0.3, 'burst': 1},
+}
+DEFAULT_POLICY = {'rate': 1.0, 'burst': 1}
+RETRY_POLICY = {'retries': 4, 'backoff': 2.0, 'max_wait': 120.0}
+RETRY_STATUS = [429, 500, 502, 503, 504]
+
+CLIENT = {'lock': threading.Lock(), 'session': None, 'buckets': {},
+          'stats': {}}
+
+def site(host):
+    """
+    Name a host's rate limit and counters are kept under (the host without
+    a leading www.)
+    """
+    if host.startswith('www.'):
+        return host[4:]
+    return host
+
+def set_host_rate(host, rate, burst=1):
+    """
+    Set the rate limit for a host's site (requests per second, burst size)
+    """
+    with CLIENT['lock']:
+        HOST_POLICY[site(host)] = {'rate': rate, 'burst': burst}
+        CLIENT['buckets'].pop(site(host), None)
+    return HOST_POLICY[site(host)]
+
+def get_session():
+    """
+    Return the shared keep-alive session, creating it on first use
+    """
+    with CLIENT['lock']:
+        if CLIENT['session'] is None:
+            CLIENT['session'] = requests.Session()
+            CLIENT['session'].mount('https://', HTTPAdapter(
+                    pool_connections=4, pool_maxsize=16))
+        return CLIENT['session']
+
+def host_stats(host):
+    """
+    Counters for a host (caller holds the lock)
+    """
+    return CLIENT['stats'].setdefault(host, {
+            'requests': 0, 'retries': 0, 'bytes': 0, 'limiter_wait': 0.0,
+            'backoff_wait': 0.0, 'wire': 0.0})
+
+def tally(host, **counts):
+    """
+    Add to the counters for a host
+    """
+    with CLIENT['lock']:
+        hstats = host_stats(host)
+        hstats.update({key: hstats[key] + value
+                       for key, value in counts.items()})
+
+def client_stats():
+    """
+    Return a copy of the per-host counters
+    """
+    with CLIENT['lock']:
+        return {host: dict(hstats) for host, hstats in CLIENT['stats'].items()}
+
+def reset_client_stats():
+    """
+    Zero the per-host counters
+    """
+    with CLIENT['lock']:
+        CLIENT['stats'].clear()
+
+def refill(host, now):
+    """
+    A site's bucket brought up to date (caller holds the lock)
+    """
+    policy = HOST_POLICY.get(host, DEFAULT_POLICY)
+    bucket = CLIENT['buckets'].setdefault(
+            host, {'tokens': float(policy['burst']), 'stamp': now})
+    bucket['tokens'] = min(float(policy['burst']), bucket['tokens'] +
+                           (now - bucket['stamp']) * policy['rate'])
+    bucket['stamp'] = now
+    return bucket
+
+def reserve_token(host, now):
+    """
+    Take a token from the site's bucket and return how long the caller must
+    wait before using it.  A token that is not yet available is reserved by
+    letting the bucket go negative, so concurrent callers queue up in order.
+    """
+    policy = HOST_POLICY.get(host, DEFAULT_POLICY)
+    with CLIENT['lock']:
+        bucket = refill(host, now)
+        bucket['tokens'] -= 1.0
+        if bucket['tokens'] >= 0.0:
+            return 0.0
+        return -bucket['tokens'] / policy['rate']
+
+def hold_host(host, delay, now):
+    """
+    Push back the next time the site's bucket has a token by delay seconds,
+    so every thread using the site backs off
+    """
+    policy = HOST_POLICY.get(host, DEFAULT_POLICY)
+    with CLIENT['lock']:
+        bucket = refill(host, now)
+        bucket['tokens'] = min(bucket['tokens'], 0.0) - delay * policy['rate']
+
+def wait_for_token(host):
+    """
+    Block until the site's rate limit allows another request
+    """
+    def wft_inner(delay):
+        if delay > 0.0:
+            time.sleep(delay)
+        tally(host, limiter_wait=delay)
+    wft_inner(reserve_token(host, time.monotonic()))
+
+def retry_delay(response, attempt):
+    """
+    Seconds to wait before retrying: Retry-After (seconds or http date) if
+    the server sent one, otherwise exponential backoff
+    """
+    def rd_header(value):
+        if value.isdigit():
+            return float(value)
+        try:
+            return (parsedate_to_datetime(value) -
+                    datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    def rd_inner(after):
+        if after is None:
+            return RETRY_POLICY['backoff'] * 2 ** attempt
+        return min(max(after, 0.0), RETRY_POLICY['max_wait'])
+    if response is not None and response.headers.get('Retry-After'):
+        return rd_inner(rd_header(response.headers['Retry-After'].strip()))
+    return rd_inner(None)
+
+def http_get(url, headers=None, attempt=0):
+    """
+    Rate limited GET of url through the shared session.  Retries 429/5xx
+    responses and connection errors; returns the final response.  After a
+    429 the retry waits for the held back bucket; other retries sleep.
+    """
+    host = site(urlparse(url).netloc)
+    wait_for_token(host)
+    start = time.monotonic()
+    try:
+        response = get_session().get(url, headers=headers, timeout=15)
+    except (requests.ConnectionError, requests.Timeout):
+        if attempt >= RETRY_POLICY['retries']:
+            raise
+        response = None
+    tally(host, wire=time.monotonic() - start, requests=1,
+          bytes=len(response.content) if response is not None else 0)
+    if response is not None and response.status_code not in RETRY_STATUS:
+        return response
+    if attempt >= RETRY_POLICY['retries']:
+        response.raise_for_status()
+    def hg_retry(delay):
+        if response is not None and response.status_code == 429:
+            # the wait happens (and is tallied) in wait_for_token
+            hold_host(host, delay, time.monotonic())
+            tally(host, retries=1)
+        else:
+            time.sleep(delay)
+            tally(host, retries=1, backoff_wait=delay)
+        add_count('retries')
+        return http_get(url, headers, attempt + 1)
+    return hg_retry(retry_delay(response, attempt))
+
+def client_report():
+    """
+    One line per site comparing time waiting on the limiter with time on the
+    wire
+    """
+    def cr_line(host_info):
+        return ' '.join([f'{host_info[0]}:',
+                         f'{host_info[1]["requests"]} requests',
+                         f'{host_info[1]["retries"]} retries',
+                         f'{host_info[1]["bytes"]} bytes',
+                         f'limiter {host_info[1]["limiter_wait"]:.1f}s',
+                         f'backoff {host_info[1]["backoff_wait"]:.1f}s',
+                         f'wire {host_info[1]["wire"]:.1f}s'])
+    return '\n'.join(map(cr_line, sorted(client_stats().items())))
@@ -0,0 +1,226 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Live polling of a day's CBS games.
+
+The day's scoreboard is read every interval seconds.  Each game's card on
+the scoreboard (its score, inning and status text) is its state; only games
+whose state changed since the last poll have their box scores read and
+parsed again.  The stats of the day so far are kept in live<yyyymmdd>.json
+in the stats directory, rewritten after every poll that changed a game.
+Games that are postponed, suspended or cancelled will not be finished that
+day; they are set aside (not read, not saved and not counted).  When every
+other game is final, the day is saved like a backfilled day (day file,
+season store and manifest), the schedule index is given the number of games
+that were played (so gap detection does not count the set aside games), and
+the live file is marked final.
+
+Box scores of games in progress are downloaded without being archived, so
+that every poll does not add a page to the archive; the final box score of
+each game is archived.
+
+usage:
+    python live.py [--day YYYYMMDD] [--interval SECONDS] [--polls N]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import os
+import re
+import time
+
+from sources import statdir
+from fetch_page import FETCH_CONFIG, fetch_page, net_read
+from metrics import add_count, record
+from html_parse import make_soup
+from day_manifest import mark_day, write_text_atomic
+from backfill import SOURCE_WORKERS, write_day
+from schedule import note_day
+from refresh import reparse
+
+SCOREBOARD = 'https://www.cbssports.com/mlb/scoreboard/'
+BOX_LINK = '/mlb/gametracker/boxscore/'
+POLL_INTERVAL = 60
+OFF = re.compile(r'\b(?:Postponed|Suspended|Cancell?ed|PPD)\b', re.I)
+
+def live_file(yyyymmdd):
+    """
+    Name of the in-progress stats file for a day
+    """
+    return os.sep.join([statdir('cbs'), f'live{yyyymmdd}.json'])
+
+def live_read(url, keep=False):
+    """
+    Current text of a page.  Pages are always downloaded, except in offline
+    mode where the archive is replayed; they are archived only if keep is set.
+    """
+    # pylint: disable=import-outside-toplevel
+    from http_client import http_get
+    def lr_inner(response):
+        add_count('bytes', len(response.content))
+        response.raise_for_status()
+        return response.text
+    if FETCH_CONFIG['mode'] == 'offline':
+        return fetch_page(url)
+    if keep:
+        return net_read(url).text
+    return lr_inner(http_get(url))
+
+def game_card(link):
+    """
+    The largest element around a box score link that holds no other game's
+    box score link
+    """
+    def gc_games(tag):
+        return set(map(lambda a: a['href'], tag.find_all(
+                'a', href=lambda a: a and a.startswith(BOX_LINK))))
+    def gc_inner(tag):
+        if tag.parent is None or tag.parent.name == '[document]' or \
+                len(gc_games(tag.parent)) > 1:
+            return tag
+        return gc_inner(tag.parent)
+    return gc_inner(link)
+
+def scoreboard_states(yyyymmdd):
+    """
+    {box score url: {'state': card text, 'final': bool, 'off': bool}} for the
+    games on a day's scoreboard, in scoreboard order ('off' games are
+    postponed, suspended or cancelled)
+    """
+    def ss_state(link):
+        def ss_inner(text):
+            return ['https://cbssports.com' + link['href'],
+                    {'state': text,
+                     'final': re.search(r'\bFinal\b', text) is not None,
+                     'off': OFF.search(text) is not None}]
+        return ss_inner(' '.join(game_card(link).get_text(' ').split()))
+    def ss_games(links):
+        if len(links) == 1 and 'NLA' in links[0]['href']:
+            return {}
+        return dict(map(ss_state, links))
+    def ss_unique(links):
+        return list({link['href']: link for link in links}.values())
+    return ss_games(ss_unique(make_soup(live_read(
+            SCOREBOARD + f'{yyyymmdd}/')).find_all(
+                    'a', href=lambda a: a and a.startswith(BOX_LINK))))
+
+def read_live_game(yyyymmdd, url, final=False):
+    """
+    Parse a game's current box score, as [url, [game id, stats], error].  The
+    box score of a final game is archived.
+    """
+    with record('game', 'cbs', yyyymmdd, url=url) as rec:
+        try:
+            return [url, reparse('cbs', url, live_read(url, final)), None]
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            rec |= {'ok': False, 'error': repr(exc)}
+            return [url, None, repr(exc)]
+
+def save_live(yyyymmdd, live):
+    """
+    Write the in-progress file for a day
+    """
+    write_text_atomic(live_file(yyyymmdd), json.dumps(
+            live | {'updated': datetime.now().isoformat(timespec='seconds')}))
+    return live
+
+def poll_once(yyyymmdd, live, pool):
+    """
+    One poll: re-read the games whose scoreboard state changed.  Games that
+    fail keep their old state so they are read again on the next poll.
+    Returns the updated live data and the urls that were read.
+    """
+    def po_inner(all_states):
+        states = dict(filter(lambda a: not a[1]['off'], all_states.items()))
+        def po_changed(results):
+            good = list(filter(lambda a: a[2] is None, results))
+            return [live | {
+                    'states': live['states'] | {a[0]: states[a[0]]
+                                                for a in good},
+                    'games': live['games'] | {a[0]: a[1] for a in good},
+                    'order': list(states),
+                    'off': list(filter(lambda a: a not in states,
+                                       all_states)),
+                    'failed': list(map(lambda a: [a[0], a[2]], filter(
+                            lambda a: a[2] is not None, results)))},
+                    list(map(lambda a: a[0], results))]
+        return po_changed(list(pool.map(
+                lambda a: read_live_game(yyyymmdd, a, states[a]['final']),
+                list(filter(
+                        lambda a: live['states'].get(a) != states[a],
+                        states)))))
+    with record('poll', 'cbs', yyyymmdd) as rec:
+        result = po_inner(scoreboard_states(yyyymmdd))
+        rec['read'] = len(result[1])
+        return result
+
+def all_final(live):
+    """
+    True when the scoreboard lists games and every one that is not
+    postponed, suspended or cancelled is final and was read
+    """
+    return bool(live['order'] or live['off']) and all(map(
+            lambda a: live['states'].get(a, {}).get('final') and
+            a in live['games'], live['order']))
+
+def finalize(yyyymmdd, live):
+    """
+    Save a finished day as a backfilled day, enter its played games in the
+    schedule and mark the live file final
+    """
+    with record('day', 'cbs', yyyymmdd) as rec:
+        note_day('cbs', yyyymmdd, len(live['order']))
+        mark_day('cbs', yyyymmdd, 'complete', len(live['order']),
+                 write_day('cbs', yyyymmdd, list(map(
+                         lambda a: live['games'][a], live['order']))),
+                 None, live['order'])
+        rec['status'] = 'complete'
+    return save_live(yyyymmdd, live | {'final': True})
+
+def poll_day(yyyymmdd=None, interval=POLL_INTERVAL, polls=None, workers=None):
+    """
+    Poll a day's games (default today) until all are final (or for at most
+    polls polls).  Returns the last live data.
+    """
+    if yyyymmdd is None:
+        yyyymmdd = datetime.now().strftime('%Y%m%d')
+    live = {'day': yyyymmdd, 'states': {}, 'games': {}, 'order': [],
+            'off': [], 'failed': [], 'final': False}
+    with ThreadPoolExecutor(
+            max_workers=workers or SOURCE_WORKERS['cbs']) as pool:
+        count = 0
+        while True:
+            live, read = poll_once(yyyymmdd, live, pool)
+            count += 1
+            if read:
+                save_live(yyyymmdd, live)
+            finals = len(list(filter(lambda a: live['states'].get(
+                    a, {}).get('final'), live['order'])))
+            print(f'{yyyymmdd} poll {count}: {len(read)} games read, ' +
+                  f'{finals}/{len(live["order"])} final, ' +
+                  f'{len(live["off"])} off')
+            if all_final(live):
+                return finalize(yyyymmdd, live)
+            if not (live['order'] or live['off']) or \
+                    (polls is not None and count >= polls):
+                return live
+            time.sleep(interval)
+
+def main(argv=None):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='poll live cbs box scores')
+    parser.add_argument('--day', default=None,
+                        help='day to poll (yyyymmdd, default today)')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                        help='seconds between scoreboard reads')
+    parser.add_argument('--polls', type=int, default=None,
+                        help='stop after this many polls')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='concurrent box score requests')
+    args = parser.parse_args(argv)
+    return poll_day(args.day, args.interval, args.polls, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -2,97 +2,151 @@
 """
 Main routines
 """
-from datetime import datetime
-import os
-import json
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import sys
 
-from cbs_get_game_stats import cbs_get_game_stats, cbs_get_box_urls
-from baseb_ref import br_get_game_stats, br_get_box_urls
+from day_manifest import days_with_status
+from schedule import build_schedule, scheduled_games, schedule_gaps
+from refresh import refresh_days
+from backfill import backfill_days
+from fetch_page import FETCH_CONFIG, FETCH_MODES, set_fetch_mode
+from html_parse import PARSERS, set_parser
 
-def statdir(website):
+SEASON_WINDOW = ['0315', '1115']
+
+def fix_dates(day_value):
     """
-    Switch returning data directory
+    Convert 'mm-dd-yyyy' day_value to 'yyyymmdd' format
     """
-    return {'cbs': 'cbs_stats', 'br': 'br_stats'}[website]
+    if '-' in day_value:
+        return datetime.strptime(day_value, "%m-%d-%Y").strftime("%Y%m%d")
+    return day_value
 
-def box_read(website):
+def get_box_dates(strt_date='03-30-2023', end_date=None):
     """
-    Switch returning game statistics routine
+    Return list of days (yyyymmdd) this season through yesterday (or from
+    strt_date through end_date when an end date is given)
     """
-    return {'cbs': cbs_get_game_stats, 'br': br_get_game_stats}[website]
+    def get_date_range(strt_seas):
+        def gdr_count():
+            if end_date:
+                return (datetime.strptime(fix_dates(end_date), "%Y%m%d") -
+                        strt_seas).days + 1
+            return (datetime.now() - strt_seas).days
+        return list(map(lambda a: (strt_seas + timedelta(days=a)).strftime(
+                '%Y%m%d'), range(max(gdr_count(), 0))))
+    return get_date_range(datetime.strptime(fix_dates(strt_date), "%Y%m%d"))
 
-def box_url(website):
+def in_season(yyyymmdd):
     """
-    switch returning urls of boxscores
+    True if a day falls in the part of the year when games are played
     """
-    return {'cbs': cbs_get_box_urls, 'br': br_get_box_urls}[website]
+    return SEASON_WINDOW[0] <= yyyymmdd[4:8] <= SEASON_WINDOW[1]
 
-def fix_dates(day_value):
+def find_empty_dates(website, dates=None):
     """
-    Convert 'yyyy-mm-dd' day_value to 'yyyymmdd' format
+    Find all days whose data is not completely saved (never read, failed,
+    partial, or fewer games than scheduled), using the saved day manifest.
+    Days the schedule index knows to have no games are skipped.
     """
-    if '-' in day_value:
-        return datetime.strptime(day_value, "%m-%d-%Y").strftime("%Y%m%d")
-    return day_value
+    if dates is None:
+        dates = get_box_dates()
+    return schedule_gaps(website, list(dates))
 
-def get_box_dates(strt_date='03-30-2023'):
+def update_first_empty(website, count=1, workers=None):
     """
-    Return list of days this season
+    Scan the saved stats, find the first {count} days that are not saved, and
+    fill in the stats for those days.  Days and games are read concurrently
+    by up to {workers} requests at a time.
     """
-    def get_date_range(strt_date):
-        def gdr_inner(strt_seas):
-            def days_so_far():
-                return (datetime.now() - strt_seas).days
-            return pd.date_range(strt_seas, periods=days_so_far())
-        return gdr_inner(datetime.strptime(strt_date, "%m-%d-%Y"))
-    return get_date_range(strt_date).strftime('%Y%m%d')
+    return backfill_days(website, list(map(fix_dates,
+                         find_empty_dates(website)[0:count])), workers)
 
-def update_first_empty(website):
+def select_days(website, args):
     """
-    Scan the saved stats, find the first {count} days that are not saved, and
-    fill in the stats for those days
-    """
-    def get_day_stats(day_value):
-        """
-        Collect the stats for the day specified
-        """
-        def gds_game(url):
-            return box_read(website)(url)
-        return list(map(gds_game, box_url(website)(fix_dates(day_value))))
-    def update_day(day_value, override=True):
-        """
-        Update a day's stat file
-        """
-        def upd_day(fname):
-            if not override and os.path.exists(fname):
-                return False
-            with open(fname, 'w', encoding='utf-8') as ofd:
-                if fname.startswith('br_stats'):
-                    ofd.write(json.dumps(get_day_stats(day_value)))
-                    return True
-                ofd.write(json.dumps(dict(get_day_stats(day_value))))
-                return True
-        return upd_day(os.sep.join(
-                [statdir(website), f'a{fix_dates(day_value)}.json']))
-    def find_empty_dates(website):
-        """
-        Scan the saved stats folder for all days that do not have their data saved
-        """
-        def fed_mkf(bday):
-            return os.sep.join([statdir(website), f'a{bday}.json'])
-        def fed_inner(ifile):
-            if os.path.exists(ifile):
-                return False
-            return True
-        def cleanup(fname):
-            return fname.split(os.sep)[-1].strip('.json')[1:]
-        return list(map(cleanup,
-                    list(filter(fed_inner, list(map(fed_mkf, get_box_dates()))))))
-    def update_inner(count=1):
-        return list(map(update_day, find_empty_dates(website)[0:count]))
-    return update_inner(count=1)
+    Days a command line run should fetch for a website
+    """
+    def sd_dates():
+        return list(filter(in_season, get_box_dates(args.start, args.end)))
+    def sd_count(days):
+        if args.days:
+            return days[0:args.days]
+        return days
+    if args.refresh:
+        return sd_count(sorted(set(sd_dates()) & set(days_with_status(
+                website, ['complete', 'partial']))))
+    if args.force:
+        return sd_count(list(filter(lambda a: scheduled_games(a) != 0,
+                                    sd_dates())))
+    return sd_count(find_empty_dates(website, sd_dates()))
+
+def run_source(website, args):
+    """
+    Fetch, refresh, or with --dry-run list, the selected days for a website
+    """
+    def rs_inner(days):
+        if args.dry_run:
+            return list(map(lambda a: print(f'{website} {a}'), days))
+        if args.refresh:
+            return refresh_days(website, days, args.workers)
+        return backfill_days(website, days, args.workers,
+                             args.parse_workers, args.stream)
+    return rs_inner(select_days(website, args))
+
+def main(argv=None):
+    """
+    Command line driver
+    """
+    parser = argparse.ArgumentParser(
+            description='Save daily mlb box score statistics')
+    parser.add_argument('--source', nargs='+', choices=['cbs', 'br'],
+                        default=['cbs', 'br'], help='websites to read')
+    parser.add_argument('--start', default='03-30-2023',
+                        help='first day (mm-dd-yyyy or yyyymmdd)')
+    parser.add_argument('--end', default=None,
+                        help='last day (default yesterday); the range may ' +
+                        'cover several seasons, off-season days are skipped')
+    parser.add_argument('--days', type=int, default=1,
+                        help='days to fetch per source this run (0 for all)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='concurrent requests per source')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='parse pages in this many processes ' +
+                        '(0 parses in the request threads)')
+    parser.add_argument('--stream', action='store_true',
+                        help='write each game to disk as soon as it is read ' +
+                        '(memory stays flat over any number of days)')
+    parser.add_argument('--force', action='store_true',
+                        help='fetch days that are already saved again')
+    parser.add_argument('--refresh', action='store_true',
+                        help='revalidate saved days and rewrite only games ' +
+                        'whose box score changed')
+    parser.add_argument('--build-schedule', action='store_true',
+                        help='first read the cbs scoreboards of days ' +
+                        'missing from the schedule index')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='list the days that would be fetched')
+    parser.add_argument('--fetch-mode', choices=FETCH_MODES, default=None,
+                        help='live, cache or offline (page archive replay)')
+    parser.add_argument('--archive', default=None,
+                        help='page archive directory')
+    parser.add_argument('--parser', choices=PARSERS, default=None,
+                        help='html parser backend (default lxml if installed)')
+    args = parser.parse_args(argv)
+    if args.parser:
+        set_parser(args.parser)
+    if args.fetch_mode or args.archive:
+        set_fetch_mode(args.fetch_mode or FETCH_CONFIG['mode'], args.archive)
+    if args.build_schedule:
+        build_schedule(list(filter(in_season, get_box_dates(args.start,
+                                                            args.end))))
+    with ThreadPoolExecutor(max_workers=len(args.source)) as pool:
+        reports = list(pool.map(lambda a: run_source(a, args), args.source))
+    if not args.dry_run and 'http_client' in sys.modules:
+        print(sys.modules['http_client'].client_report())
+    return reports
 
 if __name__ == "__main__":
-    update_first_empty('cbs')
-    update_first_empty('br')
+    main()
@@ -0,0 +1,174 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Per-stage instrumentation for the scrape pipeline.
+
+Work is measured inside records: one per game, one per scoreboard read and
+one per day.  While a record is open on a thread, timed stages (network
+fetch, archive read, soup parsing, table extraction, stat formatting, json
+writes ...) add their wall time to it, the fetch layer adds bytes read and
+retries, and stat formatting counts the baserunners it could not attribute
+(runners_dropped).  Game and scoreboard records are also summed into their
+day's record.  Each closed record is appended as one json line to the metrics file
+(YAROTOBALL_METRICS, default metrics.jsonl; an empty value turns output off).
+
+Outside of a record, timing calls only cost a thread-local lookup.
+profile_game runs one game's extraction under cProfile (from the command
+line, for a game of the bench corpus: bench_parsers.py --profile WEBSITE
+URL).
+"""
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+METRICS = {'path': os.environ.get('YAROTOBALL_METRICS', 'metrics.jsonl'),
+           'lock': threading.Lock(), 'days': {}}
+LOCAL = threading.local()
+
+def current():
+    """
+    The record open on this thread (None if there is none)
+    """
+    return getattr(LOCAL, 'rec', None)
+
+def add_time(name, seconds):
+    """
+    Add wall time to a stage of the open record
+    """
+    rec = current()
+    if rec is not None:
+        rec['stages'][name] = rec['stages'].get(name, 0.0) + seconds
+
+def add_count(name, count=1):
+    """
+    Add to a counter (bytes, retries, ...) of the open record
+    """
+    rec = current()
+    if rec is not None:
+        rec[name] = rec.get(name, 0) + count
+
+def timed_call(name, func, *args, **kwargs):
+    """
+    Call func, charging its wall time to stage name
+    """
+    if current() is None:
+        return func(*args, **kwargs)
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+def timed(name):
+    """
+    Decorator charging a function's wall time to stage name
+    """
+    def t_deco(func):
+        @wraps(func)
+        def t_inner(*args, **kwargs):
+            return timed_call(name, func, *args, **kwargs)
+        return t_inner
+    return t_deco
+
+def emit(rec):
+    """
+    Append a closed record to the metrics file
+    """
+    if METRICS['path']:
+        with METRICS['lock']:
+            with open(METRICS['path'], 'a', encoding='utf-8') as ofd:
+                ofd.write(json.dumps(rec) + '\n')
+    return rec
+
+def sum_into(total, rec):
+    """
+    Add a record's stage times and counters into a total.  A game record
+    counts as one game (and one failure if it did not finish).
+    """
+    total['stages'] = total['stages'] | {
+            key: total['stages'].get(key, 0.0) + value
+            for key, value in rec['stages'].items()}
+    total['bytes'] += rec.get('bytes', 0)
+    total['retries'] += rec.get('retries', 0)
+    total['runners_dropped'] += rec.get('runners_dropped', 0)
+    total['games'] += rec.get('games', int(rec['kind'] == 'game'))
+    total['failed'] += rec.get('failed', int(rec['kind'] == 'game' and
+                                             not rec['ok']))
+    return total
+
+def day_total(source, day):
+    """
+    Running total for a day (caller holds the lock)
+    """
+    return METRICS['days'].setdefault((source, day), {
+            'kind': 'total', 'stages': {}, 'bytes': 0, 'retries': 0,
+            'runners_dropped': 0, 'games': 0, 'failed': 0})
+
+def day_count(source, day, name):
+    """
+    Counter name of a day's running total so far
+    """
+    with METRICS['lock']:
+        return METRICS['days'].get((source, day), {}).get(name, 0)
+
+def close(rec, start):
+    """
+    Finish a record: games and scoreboards are added to their day, and a day
+    takes over its running total
+    """
+    rec['wall'] = time.perf_counter() - start
+    with METRICS['lock']:
+        if rec['kind'] == 'day':
+            sum_into(rec, day_total(rec['source'], rec['day']))
+            METRICS['days'].pop((rec['source'], rec['day']))
+        else:
+            sum_into(day_total(rec['source'], rec['day']), rec)
+    return emit(rec)
+
+def absorb(rec):
+    """
+    Add a record closed in another process (a parse worker) to its day
+    """
+    with METRICS['lock']:
+        sum_into(day_total(rec['source'], rec['day']), rec)
+    return rec
+
+@contextmanager
+def record(kind, source, day, **keys):
+    """
+    Open a record ('game', 'scoreboard' or 'day') on this thread for the
+    duration of a with block
+    """
+    rec = {'kind': kind, 'source': source, 'day': day, 'stamp': time.time(),
+           'stages': {}, 'bytes': 0, 'retries': 0, 'ok': True} | keys
+    if kind == 'day':
+        rec |= {'runners_dropped': 0, 'games': 0, 'failed': 0}
+    prev = current()
+    LOCAL.rec = rec
+    start = time.perf_counter()
+    try:
+        yield rec
+    except Exception:
+        rec['ok'] = False
+        raise
+    finally:
+        LOCAL.rec = prev
+        close(rec, start)
+
+def profile_game(extract, url, limit=25):
+    """
+    Run one game's extraction (extract(url), a box_read routine) under
+    cProfile and return the top entries by cumulative time
+    """
+    # pylint: disable=import-outside-toplevel
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.runcall(extract, url)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(
+            limit)
+    return out.getvalue()
@@ -0,0 +1,112 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Two stage game pipeline.  I/O threads read the raw box score pages (from the
+network or the page archive); at most queue_size pages wait for parsing at
+a time.  A process pool parses and transforms the games on all cores and
+sends back only the plain stat lists and dicts, together with each game's
+metrics record.
+
+The worker processes are started by a forkserver (spawn where there is no
+forkserver), not forked from the I/O threads, so a worker can never inherit
+a lock that a thread held at the time; the parser backend and fetch mode
+selected in the parent are passed to them by the pool initializer.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import threading
+
+from sources import box_read
+from fetch_page import FETCH_CONFIG, PAGE_MEMO, fetch_page, set_fetch_mode
+from html_parse import PARSER_CONFIG, set_parser
+from metrics import METRICS, absorb, record
+
+def pool_context():
+    """
+    Start method for the parse processes
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def init_worker(backend, fetch_config):
+    """
+    Set up a parse process (runs once in each worker)
+    """
+    set_parser(backend)
+    set_fetch_mode(fetch_config['mode'], fetch_config['archive'])
+
+def parse_game(website, day, url, text):
+    """
+    Parse one game from its page text (runs in a worker process).  Returns
+    [[url, stats, error], metrics record].
+    """
+    PAGE_MEMO[url] = text
+    try:
+        with record('game', website, day, url=url) as rec:
+            try:
+                return [[url, box_read(website)(url), None], rec]
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                rec |= {'ok': False, 'error': repr(exc)}
+                return [[url, None, repr(exc)], rec]
+    finally:
+        PAGE_MEMO.pop(url, None)
+        METRICS['days'].pop((website, day), None)
+
+def read_page(website, day, url):
+    """
+    Page text for a game, as [text, error]
+    """
+    with record('page', website, day, url=url) as rec:
+        try:
+            return [fetch_page(url), None]
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            rec |= {'ok': False, 'error': repr(exc)}
+            return [None, repr(exc)]
+
+def done(value):
+    """
+    A future that already holds value
+    """
+    fut = Future()
+    fut.set_result(value)
+    return fut
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def run_games(website, day_urls, on_day, fetch_workers, parse_workers=None,
+              queue_size=None):
+    """
+    Read and parse the games of [[day, urls], ...].  As soon as all games of
+    a day are parsed (days are taken in order), on_day is called with the day
+    and the list of [url, stats, error] for its games.  Returns the on_day
+    results.
+    """
+    parse_workers = parse_workers or os.cpu_count()
+    slots = threading.BoundedSemaphore(queue_size or 2 * parse_workers)
+    with ThreadPoolExecutor(max_workers=fetch_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=parse_workers,
+                                mp_context=pool_context(),
+                                initializer=init_worker,
+                                initargs=(PARSER_CONFIG['backend'],
+                                          dict(FETCH_CONFIG))) \
+            as cpu_pool:
+        def rg_fetch(day, url):
+            slots.acquire()  # pylint: disable=consider-using-with
+            text, error = read_page(website, day, url)
+            if error is not None:
+                slots.release()
+                return done([[url, None, error], None])
+            fut = cpu_pool.submit(parse_game, website, day, url, text)
+            fut.add_done_callback(lambda _: slots.release())
+            return fut
+        def rg_result(io_fut):
+            def rr_inner(result):
+                if result[1] is not None:
+                    absorb(result[1])
+                return result[0]
+            return rr_inner(io_fut.result().result())
+        def rg_day(day_info):
+            return list(map(lambda a: io_pool.submit(rg_fetch, day_info[0],
+                                                     a), day_info[1]))
+        return list(map(lambda a: on_day(a[0], list(map(rg_result, a[1]))),
+                        list(map(lambda a: [a[0], rg_day(a)], day_urls))))
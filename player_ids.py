@@ -0,0 +1,252 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Cross-source player identity map between CBS ids and Baseball-Reference ids.
+
+The map is built incrementally from days that both websites have in the
+season store.  For each day, every CBS game is paired with the
+Baseball-Reference game whose stat lines overlap it most, the two teams are
+paired the same way, and players are matched within a team by stat line
+(ties broken by surname).  Players that cannot be matched, or that match more
+than one candidate, are reported.  Matches are saved in the store; lookups
+go through dictionaries loaded from it.
+
+Baseball-Reference days saved before pitchers without a batting line were
+kept have no lines for those pitchers, so their CBS pitchers were reported
+unmatched.  Once such days are saved again, update_id_map(redo=days) matches
+them again; a pairing already counted for a day is not counted twice.
+"""
+from collections import Counter
+
+from season_store import connect, read_range
+
+SIG_COLS = ['bat', 'AB', 'R', 'H', 'RBI', 'HR', 'pit', 'Outs', 'ER', 'SO']
+SUFFIXES = ['', 'jr', 'sr', 'ii', 'iii', 'iv']
+LINE_INFO = ['game', 'player', 'name', 'team'] + SIG_COLS
+
+ID_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS player_ids (cbs_id TEXT PRIMARY KEY, ' +
+    'br_id TEXT NOT NULL, name TEXT, matches INTEGER NOT NULL DEFAULT 0, ' +
+    'conflicts INTEGER NOT NULL DEFAULT 0, last_day TEXT)',
+    'CREATE INDEX IF NOT EXISTS player_ids_br ON player_ids (br_id)',
+    'CREATE TABLE IF NOT EXISTS id_days (day TEXT PRIMARY KEY, ' +
+    'matched INTEGER, ambiguous INTEGER, unmatched INTEGER)',
+]
+
+def id_connect(conn=None):
+    """
+    Season store connection with the identity tables created
+    """
+    def ic_inner(db_conn):
+        list(map(db_conn.execute, ID_SCHEMA))
+        return db_conn
+    return ic_inner(conn or connect())
+
+def surname(name):
+    """
+    Comparable surname from a CBS name slug ('andrew-mccutchen') or a
+    Baseball-Reference name ('Andrew McCutchen')
+    """
+    def sn_inner(words):
+        if not words:
+            return ''
+        return words[-1]
+    return sn_inner(list(filter(lambda a: a not in SUFFIXES, map(
+            lambda a: ''.join(filter(str.isalpha, a)).lower(),
+            name.replace('-', ' ').split()))))
+
+def day_lines(source, day, conn):
+    """
+    A day's lines for one website as a list of dicts
+    """
+    def dl_inner(cols):
+        return list(map(lambda a: dict(zip(LINE_INFO, a)),
+                        zip(*map(lambda a: cols[a], LINE_INFO))))
+    return dl_inner(read_range(day, day, source, LINE_INFO, conn))
+
+def group_by(lines, key):
+    """
+    dict of key value to lines with that value
+    """
+    def gb_inner(groups):
+        list(map(lambda a: groups.setdefault(a[key], []).append(a), lines))
+        return groups
+    return gb_inner({})
+
+def signature(line):
+    """
+    Stat line used to recognize the same player-game on both websites
+    """
+    return tuple(map(lambda a: line[a], SIG_COLS))
+
+def overlap(lines1, lines2):
+    """
+    Number of stat lines two groups of lines have in common
+    """
+    return sum((Counter(map(signature, lines1)) &
+                Counter(map(signature, lines2))).values())
+
+def pair_groups(groups1, groups2):
+    """
+    Greedily pair the groups (games or teams) of one website with those of
+    the other by largest stat line overlap
+    """
+    def pg_inner(scores, pairs):
+        if not scores:
+            return pairs
+        return pg_inner(list(filter(lambda a: a[1] != scores[0][1] and
+                                    a[2] != scores[0][2], scores[1:])),
+                        pairs + [[scores[0][1], scores[0][2]]])
+    return pg_inner(sorted(filter(lambda a: a[0] > 0, [
+            [overlap(groups1[key1], groups2[key2]), key1, key2]
+            for key1 in groups1 for key2 in groups2]),
+            key=lambda a: (-a[0], a[1], a[2])), [])
+
+def match_team(cbs_lines, br_lines):
+    """
+    Match players of one team in one game.  Returns [matches, ambiguous,
+    unmatched cbs lines, unmatched br lines], matches being [cbs line, br line]
+    """
+    cbs_sigs = group_by(list(map(lambda a: a | {'sig': signature(a)},
+                                 cbs_lines)), 'sig')
+    br_sigs = group_by(list(map(lambda a: a | {'sig': signature(a)},
+                                br_lines)), 'sig')
+    def mt_sig(sig):
+        def mt_cands(cbs_line):
+            return list(filter(lambda a: surname(a['name']) ==
+                               surname(cbs_line['name']), br_sigs[sig]))
+        if sig not in br_sigs:
+            return [[], [], cbs_sigs[sig], []]
+        if len(cbs_sigs[sig]) == 1 and len(br_sigs[sig]) == 1:
+            return [[[cbs_sigs[sig][0], br_sigs[sig][0]]], [], [], []]
+        def mt_named(cands):
+            return [list(map(lambda a: [a[0], a[1][0]],
+                             filter(lambda a: len(a[1]) == 1, cands))),
+                    list(map(lambda a: a[0],
+                             filter(lambda a: len(a[1]) != 1, cands))),
+                    [], []]
+        return mt_named(list(map(lambda a: [a, mt_cands(a)],
+                                 cbs_sigs[sig])))
+    def mt_combine(results):
+        def mt_unused(used):
+            return list(filter(lambda a: a['player'] not in used, br_lines))
+        return results[0:3] + [mt_unused(set(map(lambda a: a[1]['player'],
+                                                 results[0])))]
+    return mt_combine(list(map(lambda a: sum(a, []),
+                               zip(*map(mt_sig, cbs_sigs))))
+                      or [[], [], []])
+
+def match_day(day, conn=None):
+    """
+    Match the players of one day.  Returns [matches, report].
+    """
+    db_conn = conn or connect()
+    cbs_games = group_by(day_lines('cbs', day, db_conn), 'game')
+    br_games = group_by(day_lines('br', day, db_conn), 'game')
+    def md_game(gpair):
+        def md_teams(cbs_teams, br_teams):
+            return list(map(lambda a: match_team(cbs_teams[a[0]],
+                                                 br_teams[a[1]]),
+                            pair_groups(cbs_teams, br_teams)))
+        return md_teams(group_by(cbs_games[gpair[0]], 'team'),
+                        group_by(br_games[gpair[1]], 'team'))
+    results = sum(map(md_game, pair_groups(cbs_games, br_games)), [])
+    matches = sum(map(lambda a: a[0], results), [])
+    matched = set(map(lambda a: a[0]['player'], matches))
+    def md_ids(indx):
+        return sorted(set(map(lambda a: a['player'],
+                              sum(map(lambda a: a[indx], results), []))))
+    return [matches, {
+            'day': day, 'matched': len(matched),
+            'ambiguous': md_ids(1),
+            'unmatched_cbs': sorted(set(map(lambda a: a['player'],
+                                    sum(cbs_games.values(), []))) - matched -
+                                    set(md_ids(1))),
+            'unmatched_br': sorted(set(map(lambda a: a['player'],
+                                   sum(br_games.values(), []))) -
+                                   set(map(lambda a: a[1]['player'],
+                                           matches)))}]
+
+def record_match(db_conn, day, match):
+    """
+    Save one match.  A cbs id that matches a different br id than before is
+    counted as a conflict; the pairing seen most often is kept.  Returns the
+    cbs id if this match conflicts with the saved one.
+    """
+    def rm_inner(saved):
+        if saved is None:
+            db_conn.execute('INSERT INTO player_ids VALUES (?, ?, ?, 1, 0, ?)',
+                            (match[0]['player'], match[1]['player'],
+                             match[1]['name'], day))
+            return None
+        if saved[0] == match[1]['player']:
+            if saved[3] == day:
+                return None
+            db_conn.execute('UPDATE player_ids SET matches = matches + 1, ' +
+                            'last_day = ? WHERE cbs_id = ?',
+                            (day, match[0]['player']))
+            return None
+        if saved[2] >= saved[1]:
+            db_conn.execute('UPDATE player_ids SET br_id = ?, name = ?, ' +
+                            'matches = ?, conflicts = ?, last_day = ? ' +
+                            'WHERE cbs_id = ?',
+                            (match[1]['player'], match[1]['name'], 1,
+                             saved[1], day, match[0]['player']))
+            return match[0]['player']
+        db_conn.execute('UPDATE player_ids SET conflicts = conflicts + 1 ' +
+                        'WHERE cbs_id = ?', (match[0]['player'],))
+        return match[0]['player']
+    return rm_inner(db_conn.execute(
+            'SELECT br_id, matches, conflicts, last_day FROM player_ids ' +
+            'WHERE cbs_id = ?', (match[0]['player'],)).fetchone())
+
+def add_day(day, conn=None):
+    """
+    Add one day's matches to the saved identity map and return its report
+    """
+    db_conn = id_connect(conn)
+    matches, report = match_day(day, db_conn)
+    with db_conn:
+        conflicts = list(filter(None, map(
+                lambda a: record_match(db_conn, day, a), matches)))
+        db_conn.execute('INSERT OR REPLACE INTO id_days VALUES (?, ?, ?, ?)',
+                        (day, report['matched'], len(report['ambiguous']),
+                         len(report['unmatched_cbs'])))
+    return report | {'conflicts': conflicts}
+
+def update_id_map(conn=None, redo=()):
+    """
+    Add every day stored for both websites that has not been matched yet,
+    and match the days in redo again.  Returns the report for each day added.
+    """
+    db_conn = id_connect(conn)
+    def uim_inner(both):
+        return list(map(lambda a: add_day(a, db_conn), sorted(
+                set(both) - set(map(lambda a: a[0], db_conn.execute(
+                        'SELECT day FROM id_days').fetchall())) |
+                (set(redo) & set(both)))))
+    return uim_inner(list(map(lambda a: a[0], db_conn.execute(
+            "SELECT day FROM lines WHERE source = 'cbs' INTERSECT " +
+            "SELECT day FROM lines WHERE source = 'br'").fetchall())))
+
+def id_index(conn=None):
+    """
+    Load the identity map as {'cbs': {cbs id: br id}, 'br': {br id: cbs id}}
+    for constant time lookups
+    """
+    def ii_inner(rows):
+        return {'cbs': dict(rows), 'br': dict(map(lambda a: [a[1], a[0]],
+                                                  rows))}
+    return ii_inner(id_connect(conn).execute(
+            'SELECT cbs_id, br_id FROM player_ids ORDER BY matches').fetchall())
+
+def cbs_to_br(index, cbs_id):
+    """
+    Baseball-Reference id for a CBS id (None if unknown)
+    """
+    return index['cbs'].get(str(cbs_id))
+
+def br_to_cbs(index, br_id):
+    """
+    CBS id for a Baseball-Reference id (None if unknown)
+    """
+    return index['br'].get(br_id)
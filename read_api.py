@@ -0,0 +1,233 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Local read-only HTTP api over the season store.
+
+    /days?source=cbs                           stored days
+    /day?source=cbs&day=20230718               a saved day file
+    /player?id=ID[&source=cbs]                 every line of one player
+    /totals?source=cbs[&start=D&end=D]         season (or date range) totals
+    /leaders?source=cbs&stat=HR[&count=10][&lowest=1][&qualify=AB:50]
+            [&start=D&end=D]                   leaderboard
+
+Responses are json.  Results are kept in an LRU cache keyed by the query.
+Before a request is answered the store's data version (PRAGMA data_version
+on a connection held by the server) is checked; it changes whenever any
+other connection commits, so saving a new day (write_day, as used by
+update_first_empty, backfills and refreshes) empties the cache.
+
+usage:
+    python read_api.py [--host 127.0.0.1] [--port 8642]
+"""
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import math
+import sqlite3
+import threading
+import numpy as np
+
+from season_store import STORE_CONFIG, read_player, stored_days
+from season_agg import agg_connect, leaderboard, range_table, season_table
+from backfill import day_file
+
+CACHE_SIZE = 256
+CACHE = {'lock': threading.Lock(), 'results': OrderedDict(), 'version': None,
+         'watch': None, 'hits': 0, 'misses': 0}
+
+def plain(value):
+    """
+    json-ready copy of a result (numpy arrays become lists, NaN becomes None)
+    """
+    if isinstance(value, dict):
+        return {key: plain(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return list(map(plain, value))
+    if isinstance(value, np.generic):
+        return plain(value.item())
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def table_rows(table):
+    """
+    Columnar table as a list of row dicts
+    """
+    return list(map(lambda a: dict(zip(table, a)),
+                    zip(*map(plain, table.values()))))
+
+def store_version():
+    """
+    Data version of the season store as seen by the server's own connection
+    (caller holds the cache lock)
+    """
+    if CACHE['watch'] is None:
+        CACHE['watch'] = sqlite3.connect(STORE_CONFIG['path'],
+                                         check_same_thread=False)
+    return CACHE['watch'].execute('PRAGMA data_version').fetchone()[0]
+
+def invalidate():
+    """
+    Empty the result cache
+    """
+    with CACHE['lock']:
+        CACHE['results'].clear()
+        CACHE['version'] = None
+
+def cached(key, func):
+    """
+    Result of func() for key, from the cache when the store has not changed
+    since it was computed
+    """
+    with CACHE['lock']:
+        if store_version() != CACHE['version']:
+            CACHE['results'].clear()
+            CACHE['version'] = store_version()
+        if key in CACHE['results']:
+            CACHE['hits'] += 1
+            CACHE['results'].move_to_end(key)
+            return CACHE['results'][key]
+        CACHE['misses'] += 1
+        version = CACHE['version']
+    result = func()
+    with CACHE['lock']:
+        if version == CACHE['version']:
+            CACHE['results'][key] = result
+            while len(CACHE['results']) > CACHE_SIZE:
+                CACHE['results'].popitem(last=False)
+    return result
+
+def q_days(params, conn):
+    """
+    /days
+    """
+    return stored_days(params.get('source', 'cbs'), conn)
+
+def q_day(params, _):
+    """
+    /day
+    """
+    try:
+        with open(day_file(params.get('source', 'cbs'), params['day']), 'r',
+                  encoding='utf-8') as ifd:
+            return json.load(ifd)
+    except FileNotFoundError as exc:
+        raise LookupError(f'no saved day {params["day"]}') from exc
+
+def q_player(params, conn):
+    """
+    /player
+    """
+    return table_rows(read_player(params['id'], params.get('source'),
+                                  conn=conn))
+
+def stat_table(params, conn):
+    """
+    Season totals, or totals over start through end when they are given
+    """
+    if 'start' in params or 'end' in params:
+        return range_table(params.get('source', 'cbs'),
+                           params.get('start', '00000000'),
+                           params.get('end', '99999999'), conn)
+    return season_table(params.get('source', 'cbs'), conn)
+
+def q_totals(params, conn):
+    """
+    /totals
+    """
+    return table_rows(stat_table(params, conn))
+
+def q_leaders(params, conn):
+    """
+    /leaders
+    """
+    def ql_qualify():
+        if 'qualify' not in params:
+            return None
+        if ':' not in params['qualify']:
+            raise ValueError('qualify must be STAT:MINIMUM')
+        return [params['qualify'].split(':')[0],
+                int(params['qualify'].split(':')[1])]
+    return table_rows(leaderboard(stat_table(params, conn), params['stat'],
+                                  int(params.get('count', 10)),
+                                  params.get('lowest', '0') not in
+                                  ['0', 'false', ''], ql_qualify()))
+
+ROUTES = {'/days': q_days, '/day': q_day, '/player': q_player,
+          '/totals': q_totals, '/leaders': q_leaders}
+
+def answer(path, params):
+    """
+    Result of a query (through the cache)
+    """
+    def a_query():
+        conn = agg_connect()
+        try:
+            return plain(ROUTES[path](params, conn))
+        finally:
+            conn.close()
+    return cached((path, tuple(sorted(params.items()))), a_query)
+
+class ReadHandler(BaseHTTPRequestHandler):
+    """
+    GET handler for the routes in ROUTES
+    """
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Answer one query
+        """
+        url = urlparse(self.path)
+        params = {key: vals[-1] for key, vals in parse_qs(url.query).items()}
+        if url.path not in ROUTES:
+            return self.reply(404, {'error': f'unknown path {url.path}',
+                                    'paths': sorted(ROUTES)})
+        try:
+            return self.reply(200, answer(url.path, params))
+        except KeyError as exc:
+            return self.reply(400, {'error': f'missing or bad value {exc}'})
+        except ValueError as exc:
+            return self.reply(400, {'error': f'bad value: {exc}'})
+        except LookupError as exc:
+            return self.reply(404, {'error': str(exc)})
+
+    def reply(self, status, body):
+        """
+        Send a json response
+        """
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """
+        Requests are not logged
+        """
+
+def serve(host='127.0.0.1', port=8642):
+    """
+    Run the api until interrupted
+    """
+    server = ThreadingHTTPServer((host, port), ReadHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='read api over saved stats')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8642)
+    args = parser.parse_args(argv)
+    serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
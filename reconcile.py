@@ -0,0 +1,190 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Reconciliation of the CBS and Baseball-Reference stats for a date range.
+
+Both websites' lines for the range are read from the season store into numpy
+columns.  CBS players are translated to Baseball-Reference ids through the
+identity map (player_ids), and each line is keyed by day, player and its
+occurrence for that player that day (so the two games of a doubleheader are
+paired in order).  The keys are joined in one pass and every field is
+compared over the joined lines: the batting and pitching flags on all of
+them, batting stats where both websites have a batting line, pitching stats
+where both have a pitching line.
+
+The report gives per-field checked and different counts and rates, the
+lines that could not be joined, how many of the CBS pitcher-only lines (a
+pitching line and no batting line) were compared, and the list of
+discrepancies.  From the command line a field rate above --max-rate fails
+the run (exit status 1), so the reconciliation can gate a nightly load; so
+does a range with pitcher-only lines none of which were compared, since
+the pitching rates would then be measured over nothing.
+
+usage:
+    python reconcile.py START END [--max-rate 0.01] [--show 20]
+"""
+import argparse
+import json
+import sys
+import numpy as np
+
+from season_store import BAT_COLS, PIT_COLS, connect, read_range
+from player_ids import id_index, update_id_map
+
+FIELDS = ['bat'] + BAT_COLS + ['pit'] + PIT_COLS
+MAX_RATE = 0.01
+
+def source_lines(source, start, end, conn):
+    """
+    A website's lines for a date range as a dict of numpy arrays
+    """
+    def sl_inner(lines):
+        return {col: np.asarray(lines[col], dtype=str)
+                for col in ['day', 'game', 'player', 'name']} | \
+               {col: np.asarray(lines[col], dtype=np.int64) for col in FIELDS}
+    return sl_inner(read_range(start, end, source,
+                               ['day', 'game', 'player', 'name'] + FIELDS,
+                               conn))
+
+def occurrence(keys, order_by):
+    """
+    For each key, how many earlier rows (in order_by order) have the same key
+    """
+    def oc_inner(order):
+        def oc_runs(new_run):
+            pos = np.arange(len(order))
+            occ = np.empty(len(order), dtype=np.int64)
+            occ[order] = pos - np.maximum.accumulate(np.where(new_run, pos, 0))
+            return occ
+        return oc_runs(np.append(True, keys[order][1:] != keys[order][:-1]))
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return oc_inner(np.lexsort((order_by, keys)))
+
+def join_keys(days, players, order_by):
+    """
+    day|player|occurrence key for each line
+    """
+    def jk_inner(base):
+        return np.char.add(base, occurrence(base, order_by).astype(str))
+    return jk_inner(np.char.add(np.char.add(np.char.add(days, '|'), players),
+                                '|'))
+
+def field_masks(cbs, br):
+    """
+    {field: mask of the joined lines on which the field is compared}
+    """
+    both_bat = (cbs['bat'] == 1) & (br['bat'] == 1)
+    both_pit = (cbs['pit'] == 1) & (br['pit'] == 1)
+    return {'bat': np.ones(len(both_bat), dtype=bool)} | \
+           {field: both_bat for field in BAT_COLS} | \
+           {'pit': np.ones(len(both_bat), dtype=bool)} | \
+           {field: both_pit for field in PIT_COLS}
+
+def compare_lines(cbs, br):
+    """
+    Field summary and discrepancy list for joined lines (dicts of equal
+    length arrays)
+    """
+    def cl_field(field, mask):
+        def cf_inner(diff):
+            return [field, {'checked': int(mask.sum()),
+                            'different': int(diff.sum()),
+                            'rate': float(diff.sum() / mask.sum())
+                            if mask.any() else 0.0},
+                    list(map(lambda a: {
+                            'day': str(cbs['day'][a]), 'field': field,
+                            'cbs_game': str(cbs['game'][a]),
+                            'br_game': str(br['game'][a]),
+                            'cbs_id': str(cbs['player'][a]),
+                            'br_id': str(br['player'][a]),
+                            'name': str(br['name'][a]),
+                            'cbs': int(cbs[field][a]), 'br': int(br[field][a])},
+                             np.nonzero(diff)[0]))]
+        return cf_inner(mask & (cbs[field] != br[field]))
+    def cl_inner(results):
+        return [dict(map(lambda a: a[0:2], results)),
+                sorted(sum(map(lambda a: a[2], results), []),
+                       key=lambda a: (a['day'], a['br_game'], a['br_id']))]
+    return cl_inner(list(map(lambda a: cl_field(*a),
+                             field_masks(cbs, br).items())))
+
+def pitcher_only(lines):
+    """
+    Mask of the lines with a pitching line and no batting line
+    """
+    return (lines['bat'] == 0) & (lines['pit'] == 1)
+
+def reconcile(start, end, conn=None, update_ids=True):
+    """
+    Compare the two websites over days start through end (yyyymmdd).
+    Returns the report as a dict.
+    """
+    db_conn = conn or connect()
+    if update_ids:
+        update_id_map(db_conn)
+    cbs = source_lines('cbs', start, end, db_conn)
+    br = source_lines('br', start, end, db_conn)
+    index = id_index(db_conn)['cbs']
+    cbs_ids = np.asarray(list(map(lambda a: index.get(a, ''),
+                                  cbs['player'])), dtype=str)
+    mapped = cbs_ids != ''
+    pit_only = int(pitcher_only(cbs).sum())
+    cbs = {col: vals[mapped] for col, vals in cbs.items()}
+    _, cbs_at, br_at = np.intersect1d(
+            join_keys(cbs['day'], cbs_ids[mapped], cbs['game']),
+            join_keys(br['day'], br['player'], br['game'].astype(np.int64)),
+            assume_unique=True, return_indices=True)
+    fields, found = compare_lines({col: vals[cbs_at]
+                                   for col, vals in cbs.items()},
+                                  {col: vals[br_at]
+                                   for col, vals in br.items()})
+    return {'start': start, 'end': end, 'compared': len(cbs_at),
+            'unmapped_cbs': int((~mapped).sum()),
+            'cbs_only': len(cbs['player']) - len(cbs_at),
+            'br_only': len(br['player']) - len(br_at),
+            'pitcher_only': pit_only,
+            'pitcher_only_compared': int(pitcher_only(
+                    {col: vals[cbs_at] for col, vals in cbs.items()}).sum()),
+            'fields': fields, 'discrepancies': found}
+
+def fmt_report(report, show=20):
+    """
+    Printable summary of a report
+    """
+    return '\n'.join(
+        [f'{report["start"]}-{report["end"]}: {report["compared"]} lines ' +
+         f'compared, {report["cbs_only"]} cbs only, {report["br_only"]} br ' +
+         f'only, {report["unmapped_cbs"]} cbs lines without a br id, ' +
+         f'{report["pitcher_only_compared"]} of ' +
+         f'{report["pitcher_only"]} pitcher-only lines compared'] +
+        list(map(lambda a: f'{a[0]:5} {a[1]["different"]:6} / ' +
+                 f'{a[1]["checked"]:6} {100 * a[1]["rate"]:6.2f}%',
+                 report['fields'].items())) +
+        list(map(json.dumps, report['discrepancies'][0:show])))
+
+def main(argv):
+    """
+    Command line entry
+    """
+    parser = argparse.ArgumentParser(description='compare cbs and br stats')
+    parser.add_argument('start', help='first day (yyyymmdd)')
+    parser.add_argument('end', help='last day (yyyymmdd)')
+    parser.add_argument('--max-rate', type=float, default=MAX_RATE,
+                        help='largest acceptable discrepancy rate per field')
+    parser.add_argument('--show', type=int, default=20,
+                        help='discrepancies to print')
+    args = parser.parse_args(argv)
+    report = reconcile(args.start, args.end)
+    print(fmt_report(report, args.show))
+    failed = list(filter(lambda a: report['fields'][a]['rate'] > args.max_rate,
+                         FIELDS))
+    if failed:
+        print(f'discrepancy rate above {args.max_rate}: {", ".join(failed)}')
+        return 1
+    if report['pitcher_only'] and not report['pitcher_only_compared']:
+        print('no pitcher-only lines were compared')
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
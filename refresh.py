@@ -0,0 +1,115 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Refresh of already saved days to pick up box score corrections.
+
+Every saved game is revalidated against the website (a conditional request
+when the page archive holds validators for it, otherwise a download compared
+by the digest of the tables the parsers read).  Only games whose box score
+changed are parsed again, and a day file is only rewritten when at least one
+of its games changed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+from sources import box_read, box_url
+from fetch_page import PAGE_MEMO, revalidate
+from day_manifest import load_manifest, mark_day, days_with_status
+from backfill import SOURCE_WORKERS, day_file, write_day
+from metrics import record
+
+def saved_urls(website, day):
+    """
+    Box score urls saved for a day, in day file order.  Days saved before
+    the manifest kept urls fall back to the day's scoreboard.
+    """
+    def su_inner(entry):
+        if 'urls' in entry:
+            return entry['urls']
+        return box_url(website)(day)
+    return su_inner(load_manifest(website).get(day, {}))
+
+def reparse(website, url, text):
+    """
+    Parse a game from page text that was just downloaded
+    """
+    PAGE_MEMO[url] = text
+    try:
+        return box_read(website)(url)
+    finally:
+        PAGE_MEMO.pop(url, None)
+
+def refresh_game(website, day, url):
+    """
+    Revalidate one saved game.  Returns [url, changed, stats, error]; stats
+    is only set for a game that changed.
+    """
+    with record('refresh', website, day, url=url) as rec:
+        try:
+            changed, text = revalidate(url)
+            rec['changed'] = changed
+            if not changed:
+                return [url, False, None, None]
+            return [url, True, reparse(website, url, text), None]
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            rec |= {'ok': False, 'error': repr(exc)}
+            return [url, False, None, repr(exc)]
+
+def load_day(website, day):
+    """
+    Saved games of a day in the form write_day takes
+    """
+    with open(day_file(website, day), 'r', encoding='utf-8') as ifd:
+        if website == 'br':
+            return json.load(ifd)
+        return list(map(list, json.load(ifd).items()))
+
+def apply_changes(website, day, urls, results):
+    """
+    Replace the changed games of a day and rewrite it.  cbs games are
+    matched by game id, baseball-reference games by position.
+    """
+    def ac_cbs(games):
+        def ac_game(game):
+            return changed.get(game[0], game)
+        changed = dict(map(lambda a: [a[2][0], a[2]], results))
+        return list(map(ac_game, games)) + list(filter(
+                lambda a: a[0] not in dict(games), changed.values()))
+    def ac_br(games):
+        def ac_game(indx):
+            return by_url.get(urls[indx], games[indx])
+        by_url = dict(map(lambda a: [a[0], a[2]], results))
+        return list(map(ac_game, range(len(games))))
+    def ac_write(games):
+        entry = load_manifest(website)[day]
+        mark_day(website, day, entry['status'], entry['games'],
+                 write_day(website, day, games), entry.get('failed'), urls)
+        return len(results)
+    return ac_write({'cbs': ac_cbs, 'br': ac_br}[website](
+            load_day(website, day)))
+
+def refresh_days(website, days=None, workers=None):
+    """
+    Revalidate the saved games of days (default: every complete or partial
+    day in the manifest).  Returns a report per day.
+    """
+    if days is None:
+        days = days_with_status(website, ['complete', 'partial'])
+    with ThreadPoolExecutor(
+            max_workers=workers or SOURCE_WORKERS[website]) as pool:
+        def rd_day(day_futures):
+            def rd_inner(results):
+                changed = list(filter(lambda a: a[1], results))
+                if changed:
+                    apply_changes(website, day_futures[0], day_futures[1],
+                                  changed)
+                return {'day': day_futures[0], 'games': len(results),
+                        'changed': list(map(lambda a: a[0], changed)),
+                        'failed': list(map(lambda a: [a[0], a[3]], filter(
+                            lambda a: a[3] is not None, results)))}
+            return rd_inner(list(map(lambda a: a.result(), day_futures[2])))
+        def rd_submit(day):
+            def rs_inner(urls):
+                return [day, urls, list(map(lambda a: pool.submit(
+                        refresh_game, website, day, a), urls))]
+            return rs_inner(saved_urls(website, day))
+        return list(map(rd_day, list(map(rd_submit, days))))
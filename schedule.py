@@ -0,0 +1,94 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Schedule index: the number of games on each day, as listed on the
+scoreboard pages.  The index is filled in whenever a scoreboard is read
+(every backfill does) or ahead of time by build_schedule, and is saved in
+schedule.json (YAROTOBALL_SCHEDULE).  A day is entered from whichever
+website's scoreboard is read first; CBS, whose scoreboard drops the All-Star
+game, replaces a Baseball-Reference count.
+
+Days known to have no games are left out of gap detection, so neither
+website's scoreboard is requested for them again, and a saved day with
+fewer games than the schedule is a gap.
+
+Days are entered like manifest entries: the file is re-read and written back
+under a file lock, so processes entering days at the same time keep each
+other's entries.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import os
+import threading
+
+from sources import box_url
+from day_manifest import DONE, load_manifest, update_json
+
+SCHEDULE = {'path': os.environ.get('YAROTOBALL_SCHEDULE', 'schedule.json'),
+            'lock': threading.Lock(), 'days': None}
+
+def load_schedule():
+    """
+    The schedule index (read once per process)
+    """
+    with SCHEDULE['lock']:
+        if SCHEDULE['days'] is None:
+            try:
+                with open(SCHEDULE['path'], 'r', encoding='utf-8') as ifd:
+                    SCHEDULE['days'] = json.load(ifd)
+            except (OSError, ValueError):
+                SCHEDULE['days'] = {}
+        return SCHEDULE['days']
+
+def note_day(website, day, games):
+    """
+    Record the number of games a website's scoreboard lists for a day
+    """
+    def nd_update(days):
+        if days.get(day, {}).get('source') == 'cbs' and website != 'cbs':
+            return False
+        days[day] = {'games': games, 'source': website,
+                     'checked': datetime.now().isoformat(timespec='seconds')}
+        return True
+    with SCHEDULE['lock']:
+        days = update_json(SCHEDULE['path'], nd_update, dict)
+        SCHEDULE['days'] = days
+        return days[day]
+
+def scheduled_games(day):
+    """
+    Number of games on a day (None if its scoreboard was never read)
+    """
+    return load_schedule().get(day, {}).get('games')
+
+def build_schedule(days, website='cbs', workers=8):
+    """
+    Read the scoreboards of the days that are not in the index yet.
+    Returns {day: games} for the days read (days whose scoreboard could not
+    be read are left out).
+    """
+    def bs_day(day):
+        try:
+            return [day, note_day(website, day,
+                                  len(box_url(website)(day)))['games']]
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(filter(None, pool.map(bs_day, list(filter(
+                lambda a: scheduled_games(a) is None, days)))))
+
+def schedule_gaps(website, dates):
+    """
+    Days in dates that have (or may have) games but are not completely saved:
+    never attempted, failed, partial, or saved with fewer games than the
+    schedule lists
+    """
+    def sg_inner(manifest):
+        def sg_gap(day):
+            if scheduled_games(day) == 0:
+                return False
+            if manifest.get(day, {}).get('status') not in DONE:
+                return True
+            return manifest[day].get('games', 0) < (scheduled_games(day) or 0)
+        return list(filter(sg_gap, dates))
+    return sg_inner(load_manifest(website))
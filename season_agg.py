@@ -0,0 +1,217 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Season aggregation and leaderboards over the season store.
+
+Per-player per-day sums are kept in a day_totals table and running season
+sums in a totals table.  Applying a day only computes that day's sums and adds
+the difference from what was previously applied for the day, so refreshing a
+day (or adding a new one) touches only the players who appeared in it.
+Grouping and rate calculations are done on numpy arrays.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+
+from season_store import BAT_COLS, PIT_COLS, connect, read_range
+
+SUM_COLS = ['games'] + BAT_COLS + PIT_COLS
+RATE_COLS = ['AVG', 'ERA', 'WHIP', 'K9']
+
+AGG_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS day_totals (source TEXT, day TEXT, ' +
+    'player TEXT, ' + ', '.join(map(lambda a: f'{a} INTEGER', SUM_COLS)) +
+    ', PRIMARY KEY (source, day, player))',
+    'CREATE TABLE IF NOT EXISTS totals (source TEXT, player TEXT, ' +
+    'name TEXT, team TEXT, ' +
+    ', '.join(map(lambda a: f'{a} INTEGER NOT NULL DEFAULT 0', SUM_COLS)) +
+    ', PRIMARY KEY (source, player))',
+]
+
+def agg_connect(conn=None):
+    """
+    Season store connection with the aggregation tables created
+    """
+    def ac_inner(db_conn):
+        list(map(db_conn.execute, AGG_SCHEMA))
+        return db_conn
+    return ac_inner(conn or connect())
+
+def group_sums(players, values):
+    """
+    Sum the rows of values (one row per line) by player.  Returns the sorted
+    unique players and a matching matrix of sums.
+    """
+    def gs_inner(keys, inverse):
+        sums = np.zeros((len(keys), values.shape[1]), dtype=np.int64)
+        np.add.at(sums, inverse, values)
+        return [keys, sums]
+    if len(players) == 0:
+        return [np.array([], dtype=str),
+                np.zeros((0, values.shape[1]), dtype=np.int64)]
+    return gs_inner(*np.unique(np.asarray(players), return_inverse=True))
+
+def line_matrix(lines):
+    """
+    Matrix of SUM_COLS for columnar store lines (games counts 1 per line)
+    """
+    return np.column_stack([np.ones(len(lines['player']), dtype=np.int64)] +
+                           list(map(lambda a: np.asarray(lines[a],
+                                                         dtype=np.int64),
+                                    SUM_COLS[1:])))
+
+def day_sums(source, day, conn):
+    """
+    Per-player sums for one stored day, from the season store
+    """
+    def ds_inner(lines):
+        return group_sums(lines['player'], line_matrix(lines))
+    return ds_inner(read_range(day, day, source,
+                               ['player'] + SUM_COLS[1:], conn))
+
+def applied_sums(source, day, conn):
+    """
+    Per-player sums previously applied to the totals for a day
+    """
+    return dict(map(lambda a: [a[0], np.array(a[1:], dtype=np.int64)],
+                    conn.execute(f'SELECT player, {", ".join(SUM_COLS)} ' +
+                                 'FROM day_totals WHERE source = ? AND ' +
+                                 'day = ?', (source, day)).fetchall()))
+
+def apply_day(source, day, conn=None):
+    """
+    Bring the running totals up to date with one stored day.  Returns the
+    number of players whose totals changed.
+    """
+    db_conn = agg_connect(conn)
+    new_keys, new_sums = day_sums(source, day, db_conn)
+    new = dict(zip(new_keys.tolist(), new_sums))
+    old = applied_sums(source, day, db_conn)
+    zero = np.zeros(len(SUM_COLS), dtype=np.int64)
+    delta = list(filter(lambda a: a[1].any(), map(
+            lambda a: [a, new.get(a, zero) - old.get(a, zero)],
+            sorted(set(new) | set(old)))))
+    with db_conn:
+        db_conn.execute('DELETE FROM day_totals WHERE source = ? AND day = ?',
+                        (source, day))
+        db_conn.executemany(
+                'INSERT INTO day_totals VALUES (' +
+                ', '.join(['?'] * (len(SUM_COLS) + 3)) + ')',
+                list(map(lambda a: tuple([source, day, a[0]] +
+                                         a[1].tolist()), new.items())))
+        db_conn.executemany(
+                f'INSERT INTO totals (source, player, {", ".join(SUM_COLS)})' +
+                ' VALUES (' + ', '.join(['?'] * (len(SUM_COLS) + 2)) + ') ' +
+                'ON CONFLICT (source, player) DO UPDATE SET ' +
+                ', '.join(map(lambda a: f'{a} = {a} + excluded.{a}',
+                              SUM_COLS)),
+                list(map(lambda a: tuple([source, a[0]] + a[1].tolist()),
+                         delta)))
+        db_conn.execute(
+                'UPDATE totals SET (name, team) = (SELECT name, team FROM ' +
+                'lines WHERE lines.source = totals.source AND ' +
+                'lines.player = totals.player AND lines.day = ? LIMIT 1) ' +
+                'WHERE source = ? AND player IN (SELECT player FROM lines ' +
+                'WHERE source = ? AND day = ?)', (day, source, source, day))
+    return len(delta)
+
+def update_totals(source, conn=None):
+    """
+    Apply every stored day that has not been applied yet.  Returns the days
+    applied.
+    """
+    db_conn = agg_connect(conn)
+    def ut_inner(days):
+        list(map(lambda a: apply_day(source, a, db_conn), days))
+        return days
+    return ut_inner(list(map(lambda a: a[0], db_conn.execute(
+            'SELECT DISTINCT day FROM lines WHERE source = ? AND day NOT IN ' +
+            '(SELECT DISTINCT day FROM day_totals WHERE source = ?) ' +
+            'ORDER BY day', (source, source)).fetchall())))
+
+def ratio(numer, denom, scale=1.0):
+    """
+    Elementwise scale * numer / denom, NaN where denom is 0
+    """
+    return np.divide(scale * numer.astype(float), denom,
+                     out=np.full(len(numer), np.nan), where=denom > 0)
+
+def with_rates(table):
+    """
+    Add AVG, ERA, WHIP and K/9 columns to a table of summed columns
+    """
+    return table | {'AVG': ratio(table['H'], table['AB']),
+                    'ERA': ratio(table['ER'], table['Outs'], 27.0),
+                    'WHIP': ratio(table['WH'], table['Outs'], 3.0),
+                    'K9': ratio(table['SO'], table['Outs'], 27.0)}
+
+def sums_table(keys, sums):
+    """
+    Columnar table (dict of arrays) from grouped keys and sums
+    """
+    return with_rates({'player': keys} |
+                      dict(zip(SUM_COLS, map(lambda a: sums[:, a],
+                                             range(len(SUM_COLS))))))
+
+def season_table(source, conn=None):
+    """
+    Season totals and rates for every player of a website, as a dict of
+    numpy arrays
+    """
+    def st_inner(rows):
+        if not rows:
+            return sums_table(np.array([], dtype=str),
+                              np.zeros((0, len(SUM_COLS)), dtype=np.int64))
+        return {'name': np.array(list(map(lambda a: a[1] or '', rows))),
+                'team': np.array(list(map(lambda a: a[2] or '', rows)))} | \
+               sums_table(np.array(list(map(lambda a: a[0], rows))),
+                          np.array(list(map(lambda a: a[3:], rows)),
+                                   dtype=np.int64))
+    return st_inner(agg_connect(conn).execute(
+            f'SELECT player, name, team, {", ".join(SUM_COLS)} FROM totals ' +
+            'WHERE source = ? ORDER BY player', (source,)).fetchall())
+
+def range_table(source, start, end, conn=None):
+    """
+    Totals and rates over days start through end (yyyymmdd, inclusive)
+    """
+    def rt_inner(rows):
+        if not rows:
+            return sums_table(np.array([], dtype=str),
+                              np.zeros((0, len(SUM_COLS)), dtype=np.int64))
+        return sums_table(*group_sums(
+                list(map(lambda a: a[0], rows)),
+                np.array(list(map(lambda a: a[1:], rows)), dtype=np.int64)))
+    return rt_inner(agg_connect(conn).execute(
+            f'SELECT player, {", ".join(SUM_COLS)} FROM day_totals WHERE ' +
+            'source = ? AND day BETWEEN ? AND ?',
+            (source, start, end)).fetchall())
+
+def rolling_table(source, end_day, ndays, conn=None):
+    """
+    Totals and rates over the ndays calendar days ending with end_day
+    (yyyymmdd)
+    """
+    return range_table(source, (datetime.strptime(end_day, '%Y%m%d') -
+                                timedelta(days=ndays - 1)).strftime('%Y%m%d'),
+                       end_day, conn)
+
+def leaderboard(table, stat, count=10, lowest=False, qualify=None):
+    """
+    The top count rows of a table by stat (lowest first if lowest is set).
+    qualify is an optional [column, minimum] that a row must reach, for
+    instance ['AB', 50] for AVG or ['Outs', 60] for ERA.  NaN values are
+    never ranked.
+    """
+    def lb_inner(keep):
+        def lb_order(values):
+            if lowest:
+                return keep[np.argsort(values[keep], kind='stable')]
+            return keep[np.argsort(-values[keep], kind='stable')]
+        return {col: table[col][lb_order(
+                np.asarray(table[stat], dtype=float))[0:count]]
+                for col in table}
+    def lb_mask():
+        if qualify is None:
+            return ~np.isnan(np.asarray(table[stat], dtype=float))
+        return ~np.isnan(np.asarray(table[stat], dtype=float)) & \
+               (table[qualify[0]] >= qualify[1])
+    return lb_inner(np.nonzero(lb_mask())[0])
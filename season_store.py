@@ -0,0 +1,185 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Season store.  Each day's player-game lines from both websites are appended
+to one SQLite table with a single normalized schema, so that date ranges or
+one player's lines can be read without loading every day file.  The per-day
+json files remain as the export format.
+
+Normalized line: source, day, game, player, name, dispname, team, position,
+bat (1 if there is a batting line), AB, R, H, RBI, HR, SB, pit (1 if there is
+a pitching line), Win, Save, Outs, WH, ER, SO.
+"""
+import json
+import math
+import os
+import sqlite3
+
+from sources import statdir
+
+STORE_CONFIG = {'path': os.environ.get('YAROTOBALL_STORE', 'season.db')}
+
+TEXT_COLS = ['source', 'day', 'game', 'player', 'name', 'dispname', 'team',
+             'position']
+BAT_COLS = ['AB', 'R', 'H', 'RBI', 'HR', 'SB']
+PIT_COLS = ['Win', 'Save', 'Outs', 'WH', 'ER', 'SO']
+LINE_COLS = TEXT_COLS + ['bat'] + BAT_COLS + ['pit'] + PIT_COLS
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS lines (' +
+    ', '.join(list(map(lambda a: f'{a} TEXT', TEXT_COLS)) +
+              list(map(lambda a: f'{a} INTEGER NOT NULL DEFAULT 0',
+                       ['bat'] + BAT_COLS + ['pit'] + PIT_COLS))) +
+    ', PRIMARY KEY (source, day, game, player))',
+    'CREATE INDEX IF NOT EXISTS lines_player ON lines (player, source, day)',
+]
+
+def connect(path=None):
+    """
+    Open the season store, creating its tables if needed
+    """
+    def c_inner(conn):
+        list(map(conn.execute, SCHEMA))
+        return conn
+    return c_inner(sqlite3.connect(path or STORE_CONFIG['path']))
+
+def as_int(value):
+    """
+    Integer value of a stat (blank, missing or NaN count as 0)
+    """
+    if value is None or value == '':
+        return 0
+    if isinstance(value, float) and math.isnan(value):
+        return 0
+    return int(value)
+
+def cbs_lines(day, stats):
+    """
+    Normalize a cbs day (dict of games keyed by game id)
+    """
+    def cl_game(game):
+        def cl_player(plyr):
+            def cl_inner(pinfo, bat, pit):
+                return {'source': 'cbs', 'day': day, 'game': game[0],
+                        'player': str(plyr[0]), 'name': pinfo['fullname'],
+                        'dispname': pinfo['dispname'], 'team': pinfo['team'],
+                        'position': bat.get('position', ''),
+                        'bat': int('batting' in plyr[1]),
+                        'SB': as_int(plyr[1].get('baserunning',
+                                                 {}).get('sb')),
+                        'pit': int('pitching' in plyr[1])} | \
+                        {key: as_int(bat.get(key)) for key in BAT_COLS[:-1]} | \
+                        {key: as_int(pit.get(key)) for key in PIT_COLS}
+            return cl_inner(plyr[1]['player'], plyr[1].get('batting', {}),
+                            plyr[1].get('pitching', {}))
+        return list(map(cl_player, game[1].items()))
+    return sum(map(cl_game, stats.items()), [])
+
+def br_lines(day, stats):
+    """
+    Normalize a baseball-reference day (list of games, which carry no id, so
+    the game's position in the day is used)
+    """
+    def bl_game(game):
+        def bl_player(plyr):
+            def bl_inner(bat, pit):
+                return {'source': 'br', 'day': day, 'game': str(game[0]),
+                        'player': plyr[0], 'name': plyr[1]['name'],
+                        'dispname': plyr[1]['name'], 'team': plyr[1]['team'],
+                        'position': plyr[1].get('position', ''),
+                        'bat': int('batting' in plyr[1]),
+                        'pit': int('pitching' in plyr[1]),
+                        'Win': as_int(pit.get('W')),
+                        'Save': as_int(pit.get('S')),
+                        'WH': as_int(pit.get('H')) + as_int(pit.get('BB'))} | \
+                        {key: as_int(bat.get(key)) for key in BAT_COLS} | \
+                        {key: as_int(pit.get(key)) for key in
+                         ['Outs', 'ER', 'SO']}
+            return bl_inner(plyr[1].get('batting', {}),
+                            plyr[1].get('pitching', {}))
+        return list(map(bl_player, game[1].items()))
+    return sum(map(bl_game, enumerate(stats)), [])
+
+def normalize_day(website, day, stats):
+    """
+    Normalized lines for a day's stats as saved in its json file
+    """
+    return {'cbs': cbs_lines, 'br': br_lines}[website](day, stats)
+
+def store_day(website, day, stats, conn=None):
+    """
+    Replace a day's lines for a website in the store
+    """
+    def sd_inner(db_conn):
+        with db_conn:
+            db_conn.execute('DELETE FROM lines WHERE source = ? AND day = ?',
+                            (website, day))
+            db_conn.executemany(
+                f'INSERT INTO lines ({", ".join(LINE_COLS)}) VALUES (' +
+                ', '.join(['?'] * len(LINE_COLS)) + ')',
+                list(map(lambda a: tuple(map(a.get, LINE_COLS)),
+                         normalize_day(website, day, stats))))
+        return db_conn
+    return sd_inner(conn or connect())
+
+def import_json_dir(website, conn=None):
+    """
+    Load every saved day file for a website into the store.  Returns the list
+    of days loaded.
+    """
+    def ijd_inner(db_conn):
+        def ijd_day(fname):
+            with open(os.sep.join([statdir(website), fname]), 'r',
+                      encoding='utf-8') as ifd:
+                store_day(website, fname[1:9], json.load(ifd), db_conn)
+            return fname[1:9]
+        return list(map(ijd_day, sorted(filter(
+                lambda a: a.startswith('a') and a.endswith('.json'),
+                os.listdir(statdir(website))))))
+    return ijd_inner(conn or connect())
+
+def columns(cursor, cols):
+    """
+    Turn the rows of a query into a dict of column lists
+    """
+    def c_inner(rows):
+        if not rows:
+            return {col: [] for col in cols}
+        return dict(zip(cols, map(list, zip(*rows))))
+    return c_inner(cursor.fetchall())
+
+def read_query(where, params, cols=None, conn=None):
+    """
+    Columnar result of a select over lines
+    """
+    def rq_inner(sel_cols):
+        return columns((conn or connect()).execute(
+                f'SELECT {", ".join(sel_cols)} FROM lines WHERE {where} ' +
+                'ORDER BY day, source, game, player', params), sel_cols)
+    return rq_inner(cols or LINE_COLS)
+
+def read_range(start, end, source=None, cols=None, conn=None):
+    """
+    Lines for days start through end (yyyymmdd, inclusive) as a dict of
+    column lists, optionally limited to one website
+    """
+    if source:
+        return read_query('source = ? AND day BETWEEN ? AND ?',
+                          (source, start, end), cols, conn)
+    return read_query('day BETWEEN ? AND ?', (start, end), cols, conn)
+
+def read_player(player, source=None, cols=None, conn=None):
+    """
+    Every line for one player (cbs id or baseball-reference id)
+    """
+    if source:
+        return read_query('player = ? AND source = ?', (str(player), source),
+                          cols, conn)
+    return read_query('player = ?', (str(player),), cols, conn)
+
+def stored_days(source, conn=None):
+    """
+    Sorted list of days stored for a website
+    """
+    return list(map(lambda a: a[0], (conn or connect()).execute(
+            'SELECT DISTINCT day FROM lines WHERE source = ? ORDER BY day',
+            (source,)).fetchall()))
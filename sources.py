@@ -0,0 +1,30 @@
+# Copyright (C) 2023 Warren Usui, MIT License
+"""
+Switches selecting per-website routines and locations.  The parsers (and
+the html parser behind them) are only imported when a routine is asked for,
+so that code that only needs locations starts quickly.
+"""
+
+def statdir(website):
+    """
+    Switch returning data directory
+    """
+    return {'cbs': 'cbs_stats', 'br': 'br_stats'}[website]
+
+def box_read(website):
+    """
+    Switch returning game statistics routine
+    """
+    # pylint: disable=import-outside-toplevel
+    from cbs_get_game_stats import cbs_get_game_stats
+    from baseb_ref import br_get_game_stats
+    return {'cbs': cbs_get_game_stats, 'br': br_get_game_stats}[website]
+
+def box_url(website):
+    """
+    switch returning urls of boxscores
+    """
+    # pylint: disable=import-outside-toplevel
+    from cbs_get_game_stats import cbs_get_box_urls
+    from baseb_ref import br_get_box_urls
+    return {'cbs': cbs_get_box_urls, 'br': br_get_box_urls}[website]